@@ -0,0 +1,199 @@
+# analytics.py
+"""
+GoalSpin - Player analytics
+- Running aggregates per (player, mode), updated in O(1) on every spin
+- Bulk recompute from stored history (vectorized with numpy if available)
+"""
+
+from array import array
+
+# Optional libs
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except Exception:
+    NUMPY_AVAILABLE = False
+
+# -----------------------
+# CONFIG
+# -----------------------
+# Win tiers by payout/bet ratio (same thresholds as the 5x3 win banner)
+WIN_TIERS = [
+    (200, "SUPER MEGA WIN"),
+    (50, "MEGA WIN"),
+    (20, "BIG WIN"),
+    (5, "WIN"),
+    (0, "MINI WIN"),
+]
+NO_WIN = "SIN PREMIO"
+TIER_NAMES = [NO_WIN] + [name for _, name in reversed(WIN_TIERS)]
+
+
+def win_tier(bet, payout):
+    if payout <= 0:
+        return NO_WIN
+    ratio = payout / (bet if bet > 0 else 1)
+    for threshold, name in WIN_TIERS:
+        if ratio >= threshold:
+            return name
+    return WIN_TIERS[-1][1]
+
+
+# -----------------------
+# Aggregates
+# -----------------------
+class PlayerStats:
+    """Running totals for one (player, mode).
+
+    A spin is "losing" when it pays less than the bet; free spins count
+    towards winnings but not towards the amount staked.
+    """
+
+    __slots__ = ("spins", "free_spins", "total_bet", "total_won", "deposits", "biggest_win",
+                 "losing_streak", "longest_losing_streak", "tier_counts", "bet_counts")
+
+    def __init__(self):
+        self.spins = 0
+        self.free_spins = 0
+        self.total_bet = 0
+        self.total_won = 0
+        self.deposits = 0
+        self.biggest_win = 0
+        self.losing_streak = 0
+        self.longest_losing_streak = 0
+        self.tier_counts = dict.fromkeys(TIER_NAMES, 0)
+        self.bet_counts = {}
+
+    def add_spin(self, bet, payout, free=False):
+        self.spins += 1
+        if free:
+            self.free_spins += 1
+        else:
+            self.total_bet += bet
+        self.total_won += payout
+        if payout > self.biggest_win:
+            self.biggest_win = payout
+        if payout < bet:
+            self.losing_streak += 1
+            if self.losing_streak > self.longest_losing_streak:
+                self.longest_losing_streak = self.losing_streak
+        else:
+            self.losing_streak = 0
+        self.tier_counts[win_tier(bet, payout)] += 1
+        self.bet_counts[bet] = self.bet_counts.get(bet, 0) + 1
+
+    def add_deposit(self, amount):
+        self.deposits += amount
+
+    @property
+    def rtp(self):
+        """Realized return to player (won / staked)."""
+        return self.total_won / self.total_bet if self.total_bet else 0.0
+
+    @property
+    def net(self):
+        return self.total_won - self.total_bet
+
+    def snapshot(self):
+        return {
+            "spins": self.spins,
+            "free_spins": self.free_spins,
+            "total_bet": self.total_bet,
+            "total_won": self.total_won,
+            "rtp": self.rtp,
+            "net": self.net,
+            "deposits": self.deposits,
+            "biggest_win": self.biggest_win,
+            "losing_streak": self.losing_streak,
+            "longest_losing_streak": self.longest_losing_streak,
+            "tier_counts": dict(self.tier_counts),
+            "bet_counts": dict(self.bet_counts),
+        }
+
+
+class Analytics:
+    """Registry of PlayerStats keyed by (player, mode)."""
+
+    def __init__(self):
+        self._stats = {}
+
+    def stats(self, player, mode):
+        key = (player, mode)
+        st = self._stats.get(key)
+        if st is None:
+            st = self._stats[key] = PlayerStats()
+        return st
+
+    def record_spin(self, player, mode, bet, payout, free=False):
+        self.stats(player, mode).add_spin(bet, payout, free)
+
+    def record_deposit(self, player, mode, amount):
+        self.stats(player, mode).add_deposit(amount)
+
+    def snapshot(self, player, mode):
+        return self.stats(player, mode).snapshot()
+
+    # ---- bulk recompute ----
+    def recompute(self, player, mode, bets, payouts, free=None, deposits=()):
+        """Rebuilds the aggregates from full history columns (oldest first)."""
+        st = _compute_numpy(bets, payouts, free) if NUMPY_AVAILABLE else _compute_python(bets, payouts, free)
+        st.deposits = sum(deposits)
+        self._stats[(player, mode)] = st
+        return st
+
+    def recompute_from_store(self, store, player, mode, player_id):
+        """Rebuilds one account from an AccountStore in a single index scan."""
+        bets = array("q")
+        payouts = array("q")
+        for _, bet, payout, _, _ in store.iter_spins(player_id):
+            bets.append(bet)
+            payouts.append(payout)
+        deposits = [amount for _, amount in store.iter_deposits(player_id)]
+        return self.recompute(player, mode, bets, payouts, deposits=deposits)
+
+
+def _compute_python(bets, payouts, free):
+    st = PlayerStats()
+    if free is None:
+        for bet, payout in zip(bets, payouts):
+            st.add_spin(bet, payout)
+    else:
+        for bet, payout, is_free in zip(bets, payouts, free):
+            st.add_spin(bet, payout, bool(is_free))
+    return st
+
+
+def _compute_numpy(bets, payouts, free):
+    st = PlayerStats()
+    bets = np.asarray(bets, dtype=np.int64)
+    payouts = np.asarray(payouts, dtype=np.int64)
+    n = len(bets)
+    if n == 0:
+        return st
+    free = np.zeros(n, dtype=bool) if free is None else np.asarray(free, dtype=bool)
+
+    st.spins = n
+    st.free_spins = int(free.sum())
+    st.total_bet = int(bets[~free].sum())
+    st.total_won = int(payouts.sum())
+    st.biggest_win = max(0, int(payouts.max()))
+
+    # losing streaks: run lengths of consecutive payout < bet
+    loss = payouts < bets
+    edges = np.diff(np.concatenate(([0], loss.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    if len(starts):
+        st.longest_losing_streak = int((ends - starts).max())
+        st.losing_streak = int(ends[-1] - starts[-1]) if ends[-1] == n else 0
+
+    # tiers: index 0 = no win, then ascending thresholds
+    ratio = payouts / np.where(bets > 0, bets, 1)
+    thresholds = np.array([t for t, _ in reversed(WIN_TIERS)], dtype=float)
+    idx = np.where(payouts > 0, np.searchsorted(thresholds, ratio, side="right"), 0)
+    for name, count in zip(TIER_NAMES, np.bincount(idx, minlength=len(TIER_NAMES))):
+        st.tier_counts[name] = int(count)
+
+    values, counts = np.unique(bets, return_counts=True)
+    st.bet_counts = {int(v): int(c) for v, c in zip(values, counts)}
+    return st
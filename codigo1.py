@@ -1,9 +1,12 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import json
-import secrets
 from datetime import datetime
-import os
+
+from analytics import Analytics
+from engine import GameDefinition, NOfAKind, SpinBatch, compile_game
+from jackpot import JackpotPool
+from spinlog import FLUSH_INTERVAL, INTERACTIVE_CHUNK_ROWS, SpinLogWriter, log_directory
+from storage import AccountStore, DB_FILE
 
 # =====================================
 # CONFIGURACIÓN GENERAL
@@ -26,75 +29,200 @@ PAYOUT_3 = {
 }
 PAYOUT_2 = 1
 
-# Archivos por modo
-SAVE_FILE_FREE = "save_free.json"
-SAVE_FILE_REAL = "save_real.json"
+# Definición declarativa del juego (misma tubería de sorteo/evaluación que el 5x3)
+GAME = compile_game(GameDefinition(
+    "goalspin_3",
+    reels=REEL_COUNT,
+    rows=1,
+    weights=dict(zip(SYMBOLS, WEIGHTS)),
+    rules=[NOfAKind({3: PAYOUT_3, 2: PAYOUT_2})],
+    rng="secrets",
+))
+
+# Bote progresivo compartido: tres de este símbolo lo cobran
+JACKPOT_SYMBOL = "trofeo"
+
+# Base de datos de cuentas (todas las cuentas y ambos modos)
+SAVE_DB = DB_FILE
+DEFAULT_PLAYER = "invitado"
+
+# Tiradas por lotes (numpy): filas por llamada y fotogramas de la animación
+BATCH_CAPACITY = 1 << 20
+SPIN_STEPS = 12
+
+# Historial: filas visibles (el registro completo queda en la base de datos)
+HISTORY_VISIBLE = 10
 
-# Estado global de modo
+# Estado global de modo y cuenta
 MODE_REAL = False
+PLAYER_NAME = DEFAULT_PLAYER
+PLAYER_ID = None
+STORE = None
+ANALYTICS = Analytics()
+JACKPOT = None
+SPIN_LOGS = {}  # modo -> registro columnar
+SPIN_BATCH = None
+ANIM_BATCH = None
 
 
 # =====================================
 # FUNCIONES AUXILIARES
 # =====================================
 
-def weighted_choice(symbols, weights):
+def weighted_choice():
     """Elige un símbolo basado en pesos probabilísticos."""
-    total = sum(weights)
-    r = secrets.randbelow(total)
-    upto = 0
-    for s, w in zip(symbols, weights):
-        if upto + w > r:
-            return s
-        upto += w
-    return symbols[-1]
+    return SYMBOLS[GAME.draw_symbol()]
 
 
 def spin_reels_once():
     """Genera una tirada completa."""
-    return [weighted_choice(SYMBOLS, WEIGHTS) for _ in range(REEL_COUNT)]
+    return GAME.names(GAME.draw())
 
 
 def evaluate_spin(symbols, bet):
     """Evalúa la tirada y devuelve (payout, mensaje)."""
-    if all(s == symbols[0] for s in symbols):
-        mult = PAYOUT_3.get(symbols[0], 0)
-        payout = bet * mult
-        result = "🎉 JACKPOT!" if mult >= 50 else "¡Tres iguales!"
-        return payout, result
-
-    counts = {}
-    for s in symbols:
-        counts[s] = counts.get(s, 0) + 1
-    if 2 in counts.values():
-        payout = bet * PAYOUT_2
-        return payout, "¡Dos iguales!"
+    res = GAME.evaluate(GAME.encode(symbols), bet)
+    if res.kind_count == REEL_COUNT:
+        mult = PAYOUT_3[SYMBOLS[res.kind_symbol]]
+        return res.payout, "🎉 JACKPOT!" if mult >= 50 else "¡Tres iguales!"
+    if res.kind_count == 2:
+        return res.payout, "¡Dos iguales!"
     return 0, "Sin premio"
 
 
-def save_score(balance, history):
-    """Guarda el estado actual según el modo de juego."""
-    file = SAVE_FILE_REAL if MODE_REAL else SAVE_FILE_FREE
-    data = {"balance": balance, "history": history[-50:]}
+def format_entry(ts, bet, symbols, msg, payout):
+    """Texto de una tirada tal como se muestra en el historial."""
+    now = datetime.fromtimestamp(ts).strftime("%H:%M:%S")
+    return f"{now} | Apuesta: {bet}$ | {list(symbols)} → {msg} (+{payout}$)"
+
+
+def get_store():
+    """Abre (una sola vez) la base de datos de cuentas."""
+    global STORE
+    if STORE is None:
+        STORE = AccountStore(SAVE_DB)
+    return STORE
+
+
+def get_jackpot():
+    """Se une (una sola vez) al bote compartido; None si no está disponible.
+
+    Solo el modo real aporta al bote y puede cobrarlo: las apuestas gratis
+    no lo inflan ni se llevan lo que financian los jugadores con dinero real.
+    """
+    global JACKPOT
+    if not MODE_REAL:
+        return None
+    if JACKPOT is None:
+        try:
+            JACKPOT = JackpotPool()
+        except Exception as e:
+            print("Error abriendo el bote:", e)
+            JACKPOT = False
+    return JACKPOT or None
+
+
+def get_spin_log():
+    """Registro columnar de tiradas (un directorio por juego y modo)."""
+    mode = current_mode()
+    log = SPIN_LOGS.get(mode)
+    if log is None:
+        log = SPIN_LOGS[mode] = SpinLogWriter(log_directory(GAME, mode), GAME, chunk_rows=INTERACTIVE_CHUNK_ROWS,
+                                              mode=mode, flush_interval=FLUSH_INTERVAL)
+    return log
+
+
+def get_spin_batch():
+    """Búferes reutilizables para tiradas por lotes; None sin numpy."""
+    global SPIN_BATCH
+    if SPIN_BATCH is None:
+        try:
+            SPIN_BATCH = SpinBatch(GAME, BATCH_CAPACITY)
+        except Exception as e:
+            print("Error preparando tiradas por lotes:", e)
+            SPIN_BATCH = False
+    return SPIN_BATCH or None
+
+
+def get_anim_batch():
+    """Búfer pequeño solo para los fotogramas de la animación; None sin numpy."""
+    global ANIM_BATCH
+    if ANIM_BATCH is None:
+        try:
+            ANIM_BATCH = SpinBatch(GAME, SPIN_STEPS + 1)
+        except Exception as e:
+            print("Error preparando tiradas por lotes:", e)
+            ANIM_BATCH = False
+    return ANIM_BATCH or None
+
+
+def simulate_spins(n, bet):
+    """Pago total de n tiradas simuladas por lotes, sin objetos por tirada."""
+    batch = get_spin_batch()
+    if batch is None:
+        return sum(evaluate_spin(spin_reels_once(), bet)[0] for _ in range(n))
+    total = 0
+    while n > 0:
+        rows = min(n, batch.capacity)
+        _, payouts = batch.spin(bet, rows)
+        total += int(payouts.sum())
+        n -= rows
+    return total
+
+
+def is_jackpot(symbols):
+    return all(s == JACKPOT_SYMBOL for s in symbols)
+
+
+def save_score(balance):
+    """Guarda el saldo de la cuenta actual (escritura en segundo plano)."""
     try:
-        with open(file, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        get_store().set_balance(PLAYER_ID, balance)
     except Exception as e:
         print("Error guardando:", e)
 
 
-def load_score():
-    """Carga el estado guardado según el modo de juego."""
-    file = SAVE_FILE_REAL if MODE_REAL else SAVE_FILE_FREE
-    if not os.path.exists(file):
-        return START_BALANCE, []
+def current_mode():
+    return "real" if MODE_REAL else "free"
+
+
+def record_spin(bet, symbols, msg, payout, ts):
+    """Registra una tirada de la cuenta actual y actualiza sus estadísticas."""
+    ANALYTICS.record_spin(PLAYER_NAME, current_mode(), bet, payout)
+    try:
+        get_spin_log().record(GAME.encode(symbols), bet, payout)
+    except Exception as e:
+        print("Error guardando registro de tiradas:", e)
+    try:
+        get_store().record_spin(PLAYER_ID, bet, payout, symbols, msg, ts)
+    except Exception as e:
+        print("Error guardando tirada:", e)
+
+
+def record_deposit(amount):
+    """Registra un depósito de la cuenta actual."""
+    ANALYTICS.record_deposit(PLAYER_NAME, current_mode(), amount)
     try:
-        with open(file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            return data.get("balance", START_BALANCE), data.get("history", [])
+        get_store().record_deposit(PLAYER_ID, amount)
+    except Exception as e:
+        print("Error guardando depósito:", e)
+
+
+def load_score(start_balance=START_BALANCE):
+    """Abre la cuenta (jugador, modo) y carga su saldo, historial reciente y estadísticas."""
+    global PLAYER_ID
+    mode = current_mode()
+    try:
+        store = get_store()
+        PLAYER_ID, balance, created = store.open_account(PLAYER_NAME, mode, start_balance)
+        if created and MODE_REAL:
+            store.record_deposit(PLAYER_ID, start_balance)
+        ANALYTICS.recompute_from_store(store, PLAYER_NAME, mode, PLAYER_ID)
+        rows = store.recent_spins(PLAYER_ID, HISTORY_VISIBLE)
+        return balance, [format_entry(ts, bet, symbols, msg, payout) for ts, bet, payout, symbols, msg in rows]
     except Exception as e:
         print("Error cargando:", e)
-        return START_BALANCE, []
+        return start_balance, []
 
 
 def simple_input(root, title, prompt):
@@ -128,19 +256,27 @@ class GoalSpinApp(tk.Tk):
         self.resizable(False, False)
 
         self._choose_mode()  # Seleccionar modo antes de cargar datos
-        self.balance, self.history = load_score()
+        self.balance, recent = load_score(self.balance)
 
         self.bet = tk.IntVar(value=MIN_BET)
         self.spinning = False
+        self._frames = None
 
         # Crear interfaz
         self._create_header()
         self._create_reels()
         self._create_controls()
-        self._create_history_panel()
+        self._create_history_panel(recent)
         self._create_footer()
 
         self.protocol("WM_DELETE_WINDOW", self._on_close)
+        self.after(int(FLUSH_INTERVAL * 1000), self._flush_spin_logs)
+
+    def _flush_spin_logs(self):
+        # Escribe las tiradas pendientes aunque el jugador deje de girar
+        for log in SPIN_LOGS.values():
+            log.maybe_flush()
+        self.after(int(FLUSH_INTERVAL * 1000), self._flush_spin_logs)
 
     # -------------------------
     # INTERFAZ
@@ -199,13 +335,14 @@ class GoalSpinApp(tk.Tk):
                                       bg="#0b6623", fg="#e6fffa")
         self.message_label.pack(pady=6)
 
-    def _create_history_panel(self):
+    def _create_history_panel(self, recent):
         frame = tk.Frame(self, bg="#0b6623")
         frame.pack(padx=12, pady=6, fill="x")
-        tk.Label(frame, text="Historial (últimos 10):", bg="#0b6623", fg="#fff").pack(anchor="w")
+        tk.Label(frame, text=f"Historial (últimos {HISTORY_VISIBLE}):", bg="#0b6623", fg="#fff").pack(anchor="w")
         self.history_box = tk.Listbox(frame, height=6, width=50)
         self.history_box.pack()
-        self._refresh_history_box()
+        for entry in recent:
+            self.history_box.insert(tk.END, entry)
 
     def _create_footer(self):
         footer = tk.Frame(self, bg="#0b6623", pady=8)
@@ -217,7 +354,9 @@ class GoalSpinApp(tk.Tk):
     # LÓGICA DE JUEGO
     # -------------------------
     def _choose_mode(self):
-        global MODE_REAL
+        global MODE_REAL, PLAYER_NAME
+        name = simple_input(self, "Jugador", "Nombre de jugador:").strip()
+        PLAYER_NAME = name or DEFAULT_PLAYER
         res = messagebox.askquestion(
             "Modo de juego",
             "¿Quieres jugar con DINERO REAL (simulado)?\n\nSí = Dinero real\nNo = Gratis",
@@ -252,17 +391,24 @@ class GoalSpinApp(tk.Tk):
             return
 
         self.balance -= bet
+        jackpot = get_jackpot()
+        if jackpot:
+            jackpot.contribute(bet)
         self._update_balance_label()
         self.message_label.config(text="Girando...")
         self.spinning = True
         self.spin_button.config(state="disabled")
 
-        steps, delay = 12, 80
+        # fotogramas de la animación sorteados de una vez en el búfer del lote
+        batch = get_anim_batch()
+        self._frames = batch.draw() if batch else None
+        steps, delay = SPIN_STEPS, 80
         self._spin_animation_step(0, steps, delay, bet)
 
     def _spin_animation_step(self, step, steps, delay, bet):
-        for lbl in self.reel_labels:
-            sym = weighted_choice(SYMBOLS, WEIGHTS)
+        frame = self._frames[step] if self._frames is not None else None
+        for i, lbl in enumerate(self.reel_labels):
+            sym = SYMBOLS[frame[i]] if frame is not None else weighted_choice()
             lbl.config(text=sym)
 
         if step < steps:
@@ -273,18 +419,23 @@ class GoalSpinApp(tk.Tk):
                 lbl.config(text=sym)
 
             payout, msg = evaluate_spin(result, bet)
+            jackpot = get_jackpot()
+            if jackpot and is_jackpot(result):
+                won = jackpot.award()
+                payout += won
+                msg = f"{msg} Bote: +{won}$"
             if payout > 0:
                 self.balance += payout
 
-            now = datetime.now().strftime("%H:%M:%S")
-            entry = f"{now} | Apuesta: {bet}$ | {result} → {msg} (+{payout}$)"
-            self.history.append(entry)
-            self._refresh_history_box()
+            ts = datetime.now().timestamp()
+            entry = format_entry(ts, bet, result, msg, payout)
+            record_spin(bet, result, msg, payout, ts)
+            self._push_history_row(entry)
             self._update_balance_label()
             self.message_label.config(text=msg)
             self.spinning = False
             self.spin_button.config(state="normal")
-            save_score(self.balance, self.history)
+            save_score(self.balance)
 
     def _deposit_money(self):
         amount = simple_input(self, "Depósito", "¿Cuánto dinero quieres añadir?")
@@ -296,20 +447,28 @@ class GoalSpinApp(tk.Tk):
             self.balance += amount
             self._update_balance_label()
             self.message_label.config(text=f"Depósito de {amount}$ realizado con éxito.")
-            save_score(self.balance, self.history)
+            record_deposit(amount)
+            save_score(self.balance)
         except:
             messagebox.showwarning("Error", "Ingresa una cantidad válida.")
 
     def _update_balance_label(self):
         self.balance_label.config(text=f"{self.balance}$")
 
-    def _refresh_history_box(self):
-        self.history_box.delete(0, tk.END)
-        for entry in self.history[-10:][::-1]:
-            self.history_box.insert(tk.END, entry)
+    def _push_history_row(self, entry):
+        # Inserta arriba y elimina la fila más antigua: coste constante por tirada
+        self.history_box.insert(0, entry)
+        if self.history_box.size() > HISTORY_VISIBLE:
+            self.history_box.delete(HISTORY_VISIBLE, tk.END)
 
     def _on_close(self):
-        save_score(self.balance, self.history)
+        save_score(self.balance)
+        if STORE is not None:
+            STORE.close()
+        if JACKPOT:
+            JACKPOT.close()
+        for log in SPIN_LOGS.values():
+            log.close()
         self.destroy()
 
 
@@ -10,6 +10,16 @@ import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 import random
 import os
+import time
+import logging
+import threading
+
+from analytics import Analytics
+from engine import GameDefinition, Paylines, Scatter, compile_game
+from jackpot import JackpotPool
+from outcome_cache import load_tables
+from risk import RiskModel, load_round_distribution
+from spinlog import FLUSH_INTERVAL, INTERACTIVE_CHUNK_ROWS, SpinLogWriter, log_directory
 
 # Optional libs
 try:
@@ -65,6 +75,7 @@ SYMBOL_WEIGHTS = {
 
 BET_OPTIONS = [1, 5, 10, 20, 30, 40, 50, 100, 200]
 MAX_INITIAL_DEPOSIT = 10000
+RISK_SPINS = 200  # horizon of the risk-of-ruin panel (paid spins)
 
 # Base payouts per symbol (used when line wins)
 BASE_PAYOUT = {
@@ -78,6 +89,10 @@ BASE_PAYOUT = {
     "GOLD": 3   # golden ball pays like a ball (but mainly used for free spins)
 }
 COUNT_MULT = {3: 1, 4: 4, 5: 12}  # multipliers depending on consecutive count
+ALL_WILD_PAY = 5  # bet multiplier for a line made only of wilds
+WILD_KEY = "WILD"
+SCATTER_KEY = "GOLD"
+JACKPOT_KEY = "TROPHY"  # a full line of this symbol also wins the shared jackpot
 
 # Paylines (row index per column)
 PAYLINES = [
@@ -101,27 +116,62 @@ SPIN_SOUND_FILE = "spin.wav"
 WIN_SOUND_FILE = "win.wav"
 GOLD_BALL_IMAGE = "gold_ball.png"  # if present, used to render GOLD symbol
 
+# UI frame scheduler: one widget flush per frame
+FRAME_MS = 16
+BANNER_PULSE_MS = 120
+OVERLAY_PULSE_MS = 180
+
 # Free spins mapping: count_of_gold -> free spins
 FREE_SPINS_MAP = {3: 10, 4: 15, 5: 20}
 
+# Analytics key for this session (single local player)
+PLAYER_NAME = "local"
+GAME_MODE = "golden_ball"
+MONEY_MODE = "real"  # deposits are real money; no play-money mode in this game
+
+log = logging.getLogger("goalspin")
+
 # -----------------------
 # Helpers
 # -----------------------
-def weighted_choice_from_dict(d):
-    keys = list(d.keys())
-    weights = [d[k] for k in keys]
-    total = sum(weights)
-    r = random.randint(1, total)
-    upto = 0
-    for k, w in zip(keys, weights):
-        if upto + w >= r:
-            return k
-        upto += w
-    return keys[-1]
-
-def generate_grid():
-    # grid[reel][row] with keys like "BALL","GOLD",...
-    return [[weighted_choice_from_dict(SYMBOL_WEIGHTS) for _ in range(ROWS)] for _ in range(REELS)]
+# Declarative game definition, compiled into the shared engine pipeline
+GAME = compile_game(GameDefinition(
+    "golden_ball",
+    reels=REELS,
+    rows=ROWS,
+    weights=SYMBOL_WEIGHTS,
+    rules=[
+        Paylines(PAYLINES, BASE_PAYOUT, COUNT_MULT, wild=WILD_KEY, wild_line_pay=ALL_WILD_PAY),
+        Scatter(SCATTER_KEY, FREE_SPINS_MAP),
+    ],
+))
+JACKPOT_CODE = GAME.code(JACKPOT_KEY)
+_TABLES = None
+
+def get_tables():
+    # memory-mapped tables, rebuilt on disk only when the game definition changes
+    global _TABLES
+    if _TABLES is None:
+        _TABLES = load_tables(GAME)
+    return _TABLES
+
+_RISK = None
+_RISK_LOCK = threading.Lock()
+
+def get_risk_model():
+    # exact round distribution, read from the config-hash cache (derived once per definition)
+    global _RISK
+    with _RISK_LOCK:
+        if _RISK is None:
+            _RISK = RiskModel(GAME, round_pmf=load_round_distribution(GAME))
+    return _RISK
+
+def _warm_risk_model():
+    # background thread at startup: keeps the first RIESGO click off the DP
+    try:
+        get_risk_model()
+    except Exception as e:
+        print("Error calculando modelo de riesgo:", e)
 
 # Sound control (pygame preferred for music files)
 def play_spin_music(app):
@@ -174,6 +224,82 @@ def play_win_sound_once():
         except Exception:
             pass
 
+# -----------------------
+# UI frame scheduler
+# -----------------------
+class FrameScheduler:
+    """Coalesces widget updates into a single flush per UI frame.
+
+    set() merges options per widget (last value wins) and the flush runs at
+    most once every FRAME_MS. Animations are lists of step callables keyed
+    by name; starting one with a key in use cancels the old one, and steps
+    that fall due in the same frame are applied together.
+    """
+
+    def __init__(self, root, frame_ms=FRAME_MS):
+        self.root = root
+        self.frame_ms = frame_ms
+        self._pending = {}      # widget -> options
+        self._anims = {}        # key -> [steps, next index, interval_s, next due]
+        self._after_id = None
+        self._due = 0.0
+        self.frames = 0
+        self.dropped_frames = 0
+        self.coalesced = 0
+
+    def set(self, widget, **options):
+        opts = self._pending.get(widget)
+        if opts is None:
+            self._pending[widget] = options
+        else:
+            self.coalesced += sum(1 for k in options if k in opts)
+            opts.update(options)
+        self._schedule()
+
+    def animate(self, key, steps, interval_ms):
+        self._anims[key] = [list(steps), 0, interval_ms / 1000, time.monotonic()]
+        self._schedule()
+
+    def cancel(self, key):
+        self._anims.pop(key, None)
+
+    def stats(self):
+        return {"frames": self.frames, "dropped_frames": self.dropped_frames, "coalesced": self.coalesced}
+
+    def _schedule(self):
+        if self._after_id is None:
+            self._due = time.monotonic() + self.frame_ms / 1000
+            self._after_id = self.root.after(self.frame_ms, self._flush)
+
+    def _flush(self):
+        self._after_id = None
+        now = time.monotonic()
+        late = now - self._due
+        if late >= self.frame_ms / 1000:
+            self.dropped_frames += int(late * 1000 // self.frame_ms)
+        self.frames += 1
+
+        for key in list(self._anims):
+            anim = self._anims.get(key)
+            while anim is not None and anim[3] <= now:
+                steps, i = anim[0], anim[1]
+                if i >= len(steps):
+                    self._anims.pop(key, None)
+                    break
+                anim[1] += 1
+                anim[3] += anim[2]
+                steps[i]()
+                anim = self._anims.get(key)  # a step may restart or cancel its own key
+
+        pending, self._pending = self._pending, {}
+        for widget, opts in pending.items():
+            try:
+                widget.config(**opts)
+            except tk.TclError:
+                pass  # widget destroyed meanwhile
+        if self._anims or self._pending:
+            self._schedule()
+
 # -----------------------
 # App
 # -----------------------
@@ -190,6 +316,18 @@ class GoalSpinApp(tk.Tk):
         self.is_spinning = False
         self.free_spins = 0
         self.highlight_cells = []  # persistent highlight until next spin
+        self.analytics = Analytics()
+        try:
+            self.jackpot = JackpotPool()
+        except Exception:
+            self.jackpot = None
+        try:
+            self.spin_log = SpinLogWriter(log_directory(GAME, MONEY_MODE), GAME, chunk_rows=INTERACTIVE_CHUNK_ROWS,
+                                          mode=MONEY_MODE, flush_interval=FLUSH_INTERVAL)
+        except Exception:
+            self.spin_log = None
+        self._risk_thread = threading.Thread(target=_warm_risk_model, daemon=True)
+        self._risk_thread.start()
 
         # assets
         self.gold_img = None
@@ -209,10 +347,19 @@ class GoalSpinApp(tk.Tk):
         except Exception:
             x = 100
         self.balance = min(max(1, x), MAX_INITIAL_DEPOSIT)
+        self.analytics.record_deposit(PLAYER_NAME, GAME_MODE, self.balance)
 
         # build UI
+        self.ui = FrameScheduler(self)
         self._build_ui()
         self._update_balance_label()
+        self.after(int(FLUSH_INTERVAL * 1000), self._flush_spin_log)
+
+    def _flush_spin_log(self):
+        # write pending spins even while the player is idle (crash safety)
+        if self.spin_log:
+            self.spin_log.maybe_flush()
+        self.after(int(FLUSH_INTERVAL * 1000), self._flush_spin_log)
 
     def _build_ui(self):
         # Top
@@ -267,6 +414,7 @@ class GoalSpinApp(tk.Tk):
         bet_combo.pack(pady=6)
         tk.Button(leftc, text="🎰 GIRAR", bg="#ffd43b", fg="#000", font=("Helvetica", 12, "bold"), command=self.spin).pack(side="left", padx=6)
         tk.Button(leftc, text="💥 ALL IN", bg="#ff4d4d", fg="#fff", font=("Helvetica", 12, "bold"), command=self.all_in).pack(side="left", padx=6)
+        tk.Button(leftc, text="📉 RIESGO", bg="#3b5bdb", fg="#fff", font=("Helvetica", 12, "bold"), command=self.show_risk).pack(side="left", padx=6)
 
         centerc = tk.Frame(controls, bg=COLOR_FIELD_1)
         centerc.pack(side="left", padx=80)
@@ -281,6 +429,10 @@ class GoalSpinApp(tk.Tk):
         self.result_banner = tk.Label(rightc, text="", bg=COLOR_FIELD_1, fg="#ffd700", font=("Impact", 20))
         self.result_banner.pack()
         tk.Label(rightc, text=f"Depósito máximo al iniciar: {MAX_INITIAL_DEPOSIT} €", bg=COLOR_FIELD_1, fg=COLOR_TEXT).pack()
+        tk.Label(rightc, text=f"RTP teórico: {get_tables().rtp * 100:.1f} %", bg=COLOR_FIELD_1, fg=COLOR_TEXT).pack()
+
+        # persistent overlay for awards (shown with place(), never recreated)
+        self.overlay = tk.Label(self, text="", font=("Impact", 26), bg="#000000", fg="#ffd700")
 
     def _decorate_stand_graphic(self, canvas, left=True):
         # draw stylized crowd rectangles and stadium lights for more flair
@@ -317,18 +469,21 @@ class GoalSpinApp(tk.Tk):
         if self.free_spins > 0:
             # during free spins do not deduct bet
             self.free_spins -= 1
-            self.free_spins_lbl.config(text=f"Tiradas gratis restantes: {self.free_spins}")
+            self.ui.set(self.free_spins_lbl, text=f"Tiradas gratis restantes: {self.free_spins}")
             is_free = True
         else:
             if bet > self.balance:
                 messagebox.showwarning("Saldo insuficiente", "No tienes suficiente saldo.")
                 return
             self.balance -= bet
+            if self.jackpot:
+                self.jackpot.contribute(bet)
             self._update_balance_label()
             is_free = False
 
         self.is_spinning = True
-        self.result_banner.config(text="GIRANDO...", fg="#ffffff")
+        self.ui.cancel("banner")
+        self.ui.set(self.result_banner, text="GIRANDO...", fg="#ffffff", font=("Impact", 20))
 
         # start spin music
         play_spin_music(self)
@@ -342,15 +497,8 @@ class GoalSpinApp(tk.Tk):
         # display random symbols while spinning
         for c in range(REELS):
             for r in range(ROWS):
-                key = random.choice(list(SYMBOL_WEIGHTS.keys()))
-                # if GOLD and we have image, show image; else show text
-                if key == "GOLD" and self.gold_img:
-                    self.reel_labels[c][r].config(image=self.gold_img, text="", bg=COLOR_SLOT_BG)
-                    self.reel_labels[c][r].image = self.gold_img
-                else:
-                    text = SYMBOLS_TEXT.get(key, "?")
-                    self.reel_labels[c][r].config(text=text, image="", bg=COLOR_SLOT_BG, fg=COLOR_TEXT)
-                    self.reel_labels[c][r].image = None
+                key = random.choice(GAME.symbols)
+                self._render_cell(c, r, key)
         if remaining > 0:
             self.after(delay_ms, lambda: self._spin_animation(remaining - 1, delay_ms, bet, is_free))
         else:
@@ -358,22 +506,22 @@ class GoalSpinApp(tk.Tk):
             self._finalize_spin(bet, is_free)
 
     def _finalize_spin(self, bet, is_free):
-        grid = generate_grid()
+        codes, res = GAME.spin(bet)
+        grid = GAME.to_columns(codes)
         # render final grid
         for c in range(REELS):
             for r in range(ROWS):
-                key = grid[c][r]
-                if key == "GOLD" and self.gold_img:
-                    self.reel_labels[c][r].config(image=self.gold_img, text="", bg=COLOR_SLOT_BG)
-                    self.reel_labels[c][r].image = self.gold_img
-                else:
-                    txt = SYMBOLS_TEXT.get(key, "?")
-                    self.reel_labels[c][r].config(text=txt, image="", bg=COLOR_SLOT_BG, fg=COLOR_TEXT)
-                    self.reel_labels[c][r].image = None
-
-        # Evaluate payouts (lines) and free spins (based on GOLD total)
-        payout, winning_positions = self._evaluate_lines(grid, bet)
-        gold_count = self._count_gold(grid)
+                self._render_cell(c, r, grid[c][r])
+
+        # payouts (lines) and free spins (based on GOLD total) come from the engine
+        payout = res.payout
+        winning_positions = res.positions
+        jackpot_hit = any(sym == JACKPOT_CODE and cnt == REELS for _, sym, cnt, _ in res.line_wins)
+        if jackpot_hit and self.jackpot:
+            payout += self.jackpot.award()
+        self.analytics.record_spin(PLAYER_NAME, GAME_MODE, bet, payout, free=is_free)
+        if self.spin_log:
+            self.spin_log.record(codes, bet, payout, res.line_wins, res.scatter_count, free=is_free)
 
         # apply payout
         if payout > 0:
@@ -387,99 +535,44 @@ class GoalSpinApp(tk.Tk):
             self.highlight_cells = winning_positions[:]
             self._apply_highlights(self.highlight_cells)
         else:
-            self.result_banner.config(text="SIN PREMIO 😢", fg="#cccccc")
+            self.ui.set(self.result_banner, text="SIN PREMIO 😢", fg="#cccccc")
 
         # handle free spins awarding based on gold_count
-        awarded = 0
-        if gold_count >= 5:
-            awarded = FREE_SPINS_MAP[5]
-        elif gold_count == 4:
-            awarded = FREE_SPINS_MAP[4]
-        elif gold_count == 3:
-            awarded = FREE_SPINS_MAP[3]
+        awarded = res.free_spins
         if awarded > 0:
             # add to free spins pool
             self.free_spins += awarded
             # show message big
             self._show_free_spins_animation(awarded)
-            self.free_spins_lbl.config(text=f"Tiradas gratis: {self.free_spins}")
-        else:
-            # if not awarded, clear free spins label (or show remaining)
-            if self.free_spins > 0:
-                self.free_spins_lbl.config(text=f"Tiradas gratis restantes: {self.free_spins}")
-            else:
-                self.free_spins_lbl.config(text="")
 
+        # balance and free spins labels (coalesced into the next frame)
         self._update_balance_label()
         self.is_spinning = False
 
-    # -----------------------
-    # Evaluation and payouts
-    # -----------------------
-    def _evaluate_lines(self, grid, bet):
-        total_payout = 0
-        winning_positions = []
-        # for each payline evaluate consecutive from left with wild substitution
-        for pattern in PAYLINES:
-            line_keys = [grid[col][pattern[col]] for col in range(REELS)]
-            payout, count, used_sym = self._eval_line_consecutive(line_keys, bet)
-            if payout > 0:
-                total_payout += payout
-                # mark leftmost 'count' positions on that line as winning positions
-                for c in range(count):
-                    winning_positions.append((c, pattern[c]))
-        return total_payout, winning_positions
-
-    def _eval_line_consecutive(self, symbols_line, bet):
-        wild_key = "WILD"
-        # find first non-wild
-        first_non = None
-        for s in symbols_line:
-            if s != wild_key:
-                first_non = s
-                break
-        # if all wild
-        if first_non is None:
-            cnt = len(symbols_line)
-            if cnt >= 3:
-                return bet * 5, cnt, wild_key
-            return 0, 0, None
-        # count consecutive from left
-        cnt = 0
-        for s in symbols_line:
-            if s == first_non or s == wild_key:
-                cnt += 1
-            else:
-                break
-        if cnt >= 3:
-            base = BASE_PAYOUT.get(first_non, 0)
-            mult = COUNT_MULT.get(cnt, COUNT_MULT[max(COUNT_MULT.keys())])
-            payout = bet * base * mult
-            return payout, cnt, first_non
-        return 0, 0, None
-
-    def _count_gold(self, grid):
-        c = 0
-        for col in grid:
-            for key in col:
-                if key == "GOLD":
-                    c += 1
-        return c
-
     # -----------------------
     # Visual: highlights and animations
     # -----------------------
+    def _render_cell(self, c, r, key):
+        # if GOLD and we have image, show image; else show text
+        lbl = self.reel_labels[c][r]
+        if key == SCATTER_KEY and self.gold_img:
+            self.ui.set(lbl, image=self.gold_img, text="", bg=COLOR_SLOT_BG)
+            lbl.image = self.gold_img
+        else:
+            self.ui.set(lbl, text=SYMBOLS_TEXT.get(key, "?"), image="", bg=COLOR_SLOT_BG, fg=COLOR_TEXT)
+            lbl.image = None
+
     def _apply_highlights(self, cells):
         for (c, r) in cells:
             if 0 <= c < REELS and 0 <= r < ROWS:
-                self.reel_labels[c][r].config(bg=COLOR_HIGHLIGHT, fg="#000000")
+                self.ui.set(self.reel_labels[c][r], bg=COLOR_HIGHLIGHT, fg="#000000")
 
     def _clear_highlights(self):
         if not self.highlight_cells:
             return
         for (c, r) in self.highlight_cells:
             if 0 <= c < REELS and 0 <= r < ROWS:
-                self.reel_labels[c][r].config(bg=COLOR_SLOT_BG, fg=COLOR_TEXT)
+                self.ui.set(self.reel_labels[c][r], bg=COLOR_SLOT_BG, fg=COLOR_TEXT)
                 self.reel_labels[c][r].image = None
         self.highlight_cells = []
 
@@ -502,38 +595,29 @@ class GoalSpinApp(tk.Tk):
             color = "#3fa9f5"
 
         text = f"{label}  +{payout} €  (x{ratio:.1f})"
-        self.result_banner.config(text=text, fg=color)
+        self.ui.set(self.result_banner, text=text, fg=color)
 
-        # simple pulse animation by changing font size
-        sizes = [20, 26, 34, 26, 20]
-        def pulse(i=0):
-            if i >= len(sizes):
-                self.result_banner.config(font=("Impact", 20))
-                return
-            self.result_banner.config(font=("Impact", sizes[i]))
-            self.after(120, lambda: pulse(i + 1))
-        pulse()
+        # simple pulse animation by changing font size (replaces any running pulse)
+        banner = self.result_banner
+        steps = [lambda size=size: self.ui.set(banner, font=("Impact", size)) for size in (20, 26, 34, 26, 20)]
+        self.ui.animate("banner", steps, BANNER_PULSE_MS)
 
     def _show_free_spins_animation(self, awarded):
-        # center popup-like label that pulses and stays briefly
-        popup = tk.Toplevel(self)
-        popup.overrideredirect(True)
-        popup.attributes("-topmost", True)
-        popup.configure(bg="#000000")
-        w = 450; h = 140
-        sw = self.winfo_screenwidth(); sh = self.winfo_screenheight()
-        popup.geometry(f"{w}x{h}+{(sw-w)//2}+{(sh-h)//2}")
-        lbl = tk.Label(popup, text=f"🎉 ¡{awarded} TIRADAS GRATIS!", font=("Impact", 26), bg="#000000", fg="#ffd700")
-        lbl.pack(expand=True, fill="both")
-        # pulse
-        def pulse(i=0):
-            if i > 8:
-                popup.destroy()
-                return
+        # centered overlay that pulses and hides; a new award restarts it
+        overlay = self.overlay
+
+        def show():
+            # first step: new text and placement land in the same flush
+            self.ui.set(overlay, text=f"🎉 ¡{awarded} TIRADAS GRATIS!", font=("Impact", 26))
+            overlay.place(relx=0.5, rely=0.5, anchor="center", width=450, height=140)
+            overlay.lift()
+
+        steps = [show]
+        for i in range(9):
             scale = 1.0 + 0.06 * (1 if i % 2 == 0 else -1)
-            lbl.config(font=("Impact", int(26 * scale)))
-            self.after(180, lambda: pulse(i + 1))
-        pulse()
+            steps.append(lambda size=int(26 * scale): self.ui.set(overlay, font=("Impact", size)))
+        steps.append(overlay.place_forget)
+        self.ui.animate("overlay", steps, OVERLAY_PULSE_MS)
 
     # -----------------------
     # All in and balance
@@ -547,22 +631,51 @@ class GoalSpinApp(tk.Tk):
         self.bet.set(self.balance)
         self.spin()
 
+    def show_risk(self):
+        # exact risk of ruin and final balance for the current bet, no simulation
+        bet = self.bet.get()
+        if bet <= 0 or self.balance < bet:
+            messagebox.showinfo("Riesgo", "El saldo no cubre la apuesta actual.")
+            return
+        if self._risk_thread.is_alive():
+            messagebox.showinfo("Riesgo", "Calculando el modelo de riesgo, inténtalo en unos segundos.")
+            return
+        model = get_risk_model()
+        ruin = model.ruin_probability(self.balance, bet, RISK_SPINS)
+        final = model.final_balance(self.balance, bet, RISK_SPINS)
+        acc, median = 0.0, 0
+        for value in sorted(final):
+            acc += final[value]
+            if acc >= 0.5:
+                median = value
+                break
+        messagebox.showinfo(
+            "Riesgo",
+            f"Apuesta {bet} € con saldo {self.balance} €, {RISK_SPINS} tiradas pagadas:\n"
+            f"Probabilidad de quedarte sin saldo: {max(0.0, ruin) * 100:.2f} %\n"
+            f"Saldo final mediano: {median} €",
+        )
+
     def _update_balance_label(self):
-        self.balance_lbl.config(text=f"{self.balance} €")
-        if self.balance < 20:
-            self.balance_lbl.config(fg="#ff4444")
-        else:
-            self.balance_lbl.config(fg="#00ffcc")
+        color = "#ff4444" if self.balance < 20 else "#00ffcc"
+        self.ui.set(self.balance_lbl, text=f"{self.balance} €", fg=color)
         if self.free_spins > 0:
-            self.free_spins_lbl.config(text=f"Tiradas gratis restantes: {self.free_spins}")
+            self.ui.set(self.free_spins_lbl, text=f"Tiradas gratis restantes: {self.free_spins}")
         else:
-            self.free_spins_lbl.config(text="")
+            self.ui.set(self.free_spins_lbl, text="")
 
     # -----------------------
     # Close and cleanup
     # -----------------------
     def _on_close(self):
         stop_spin_music(self)
+        stats = self.ui.stats()
+        log.info("UI frames: %d, dropped: %d, coalesced writes: %d",
+                 stats["frames"], stats["dropped_frames"], stats["coalesced"])
+        if self.jackpot:
+            self.jackpot.close()
+        if self.spin_log:
+            self.spin_log.close()
         messagebox.showinfo("Gracias", "Gracias por jugar GoalSpin 2025. ¡Hasta la próxima!")
         self.destroy()
 
@@ -570,5 +683,6 @@ class GoalSpinApp(tk.Tk):
 # Run
 # -----------------------
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s: %(message)s")
     app = GoalSpinApp()
     app.mainloop()
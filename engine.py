@@ -0,0 +1,361 @@
+# engine.py
+"""
+GoalSpin - Game engine
+- A game is a declarative GameDefinition: reels, rows, symbol weights and
+  a list of win rules (NOfAKind, Paylines with wild, Scatter)
+- compile_game() turns it into integer tables and one draw/evaluate
+  pipeline shared by every variant
+- Grids are flat lists of symbol codes in reel-major order:
+  cell = reel * rows + row
+- SpinBatch draws and scores many grids at once into preallocated numpy
+  buffers (N-of-a-kind games with a lookup table; numpy optional)
+"""
+
+import random
+import secrets
+from bisect import bisect_right
+
+# Optional libs
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except Exception:
+    NUMPY_AVAILABLE = False
+
+# -----------------------
+# CONFIG
+# -----------------------
+LOOKUP_LIMIT = 1 << 16  # N-of-a-kind grids up to this many combinations use a full lookup table
+BATCH_BLOCK = 1 << 14   # rows drawn per block (keeps the float scratch in cache)
+
+
+def scatter_award(free_spins_map, count):
+    """Free spins for a scatter count (largest map key not above count)."""
+    keys = [k for k in free_spins_map if k <= count]
+    return free_spins_map[max(keys)] if keys else 0
+
+
+# -----------------------
+# Win rules (declarative)
+# -----------------------
+class NOfAKind:
+    """Pays for a group of equal symbols anywhere on the grid.
+
+    pays maps a minimum group size to a multiplier, either one number for
+    every symbol or a {symbol: multiplier} dict. A group of at least that
+    size qualifies; the highest multiplier over all qualifying groups wins.
+    """
+
+    def __init__(self, pays):
+        self.pays = pays
+
+
+class Paylines:
+    """Left-to-right runs of 3+ along each line, with optional wild.
+
+    lines: row index per reel for each line.
+    pays: base multiplier per symbol; count_mult scales it by run length
+    (lengths above the largest key use the largest key).
+    A line made only of wilds pays wild_line_pay.
+    """
+
+    def __init__(self, lines, pays, count_mult, wild=None, wild_line_pay=0, min_count=3):
+        self.lines = lines
+        self.pays = pays
+        self.count_mult = count_mult
+        self.wild = wild
+        self.wild_line_pay = wild_line_pay
+        self.min_count = min_count
+
+
+class Scatter:
+    """Counts a symbol anywhere on the grid and awards free spins.
+
+    awards maps a count to free spins; counts above the largest key use it.
+    """
+
+    def __init__(self, symbol, awards):
+        self.symbol = symbol
+        self.awards = awards
+
+
+class GameDefinition:
+    def __init__(self, name, reels, rows, weights, rules, rng="random"):
+        self.name = name
+        self.reels = reels
+        self.rows = rows
+        self.weights = dict(weights)  # symbol -> relative weight (order defines codes)
+        self.rules = list(rules)
+        self.rng = rng                # "random" or "secrets"
+
+
+# -----------------------
+# Results
+# -----------------------
+class SpinResult:
+    __slots__ = ("payout", "line_wins", "positions", "kind_count", "kind_symbol",
+                 "scatter_count", "free_spins")
+
+    def __init__(self):
+        self.payout = 0
+        self.line_wins = []     # (line index, symbol code, count, payout)
+        self.positions = []     # (reel, row) of winning cells
+        self.kind_count = 0     # size of the paying N-of-a-kind group (0 = none)
+        self.kind_symbol = None
+        self.scatter_count = 0
+        self.free_spins = 0
+
+
+# -----------------------
+# Compiled evaluators
+# -----------------------
+class _NOfAKindEval:
+    def __init__(self, rule, game):
+        n_sym = len(game.symbols)
+        self.n_sym = n_sym
+        self.mult = {}
+        for size, pay in rule.pays.items():
+            if isinstance(pay, dict):
+                self.mult[size] = [pay.get(s, 0) for s in game.symbols]
+            else:
+                self.mult[size] = [pay] * n_sym
+        self.sizes = sorted(self.mult, reverse=True)
+        self.table = None
+        if n_sym ** game.cells <= LOOKUP_LIMIT:
+            self.table = [self._best(self._decode(code, game.cells)) for code in range(n_sym ** game.cells)]
+
+    def _decode(self, code, cells):
+        out = []
+        for _ in range(cells):
+            code, c = divmod(code, self.n_sym)
+            out.append(c)
+        return out
+
+    def _best(self, grid):
+        # (group size, symbol, multiplier) of the best paying group; ties keep the larger group
+        counts = [0] * self.n_sym
+        for c in grid:
+            counts[c] += 1
+        best = (0, None, 0)
+        for sym, cnt in enumerate(counts):
+            for size in self.sizes:
+                mult = self.mult[size][sym]
+                if cnt >= size and mult and (mult, cnt) > (best[2], best[0]):
+                    best = (cnt, sym, mult)
+        return best
+
+    def evaluate(self, grid, bet, res):
+        if self.table is not None:
+            code = 0
+            for c in reversed(grid):
+                code = code * self.n_sym + c
+            size, sym, mult = self.table[code]
+        else:
+            size, sym, mult = self._best(grid)
+        if mult:
+            res.payout += bet * mult
+            res.kind_count, res.kind_symbol = size, sym
+
+
+class _PaylinesEval:
+    def __init__(self, rule, game):
+        self.rows = game.rows
+        self.min_count = rule.min_count
+        self.first_line = game.n_lines  # global index of this rule's first line
+        game.n_lines += len(rule.lines)
+        self.wild = game.code(rule.wild) if rule.wild is not None else -1
+        self.lines = [[c * game.rows + r for c, r in enumerate(line)] for line in rule.lines]
+        self.row_of = [list(line) for line in rule.lines]
+        top = max(rule.count_mult)
+        # line_pay[symbol][count] -> bet multiplier
+        self.line_pay = []
+        for code, s in enumerate(game.symbols):
+            row = [0] * (game.reels + 1)
+            for k in range(rule.min_count, game.reels + 1):
+                if code == self.wild:
+                    row[k] = rule.wild_line_pay if k == game.reels else 0
+                else:
+                    row[k] = rule.pays.get(s, 0) * rule.count_mult.get(k, rule.count_mult[top])
+            self.line_pay.append(row)
+
+    def evaluate(self, grid, bet, res):
+        wild = self.wild
+        for idx, cells in enumerate(self.lines):
+            first = wild
+            for cell in cells:
+                if grid[cell] != wild:
+                    first = grid[cell]
+                    break
+            cnt = 0
+            for cell in cells:
+                c = grid[cell]
+                if c == first or c == wild:
+                    cnt += 1
+                else:
+                    break
+            if cnt < self.min_count:
+                continue
+            pay = bet * self.line_pay[first][cnt]
+            if pay > 0:
+                res.payout += pay
+                res.line_wins.append((self.first_line + idx, first, cnt, pay))
+                rows = self.row_of[idx]
+                for c in range(cnt):
+                    res.positions.append((c, rows[c]))
+
+
+class _ScatterEval:
+    def __init__(self, rule, game):
+        self.code = game.code(rule.symbol)
+        self.awards = [scatter_award(rule.awards, n) for n in range(game.cells + 1)]
+
+    def evaluate(self, grid, bet, res):
+        n = grid.count(self.code)
+        res.scatter_count = n
+        res.free_spins += self.awards[n]
+
+
+_EVALUATORS = {NOfAKind: _NOfAKindEval, Paylines: _PaylinesEval, Scatter: _ScatterEval}
+
+
+class CompiledGame:
+    """Integer-coded tables and evaluators for one GameDefinition."""
+
+    def __init__(self, definition):
+        self.definition = definition
+        self.name = definition.name
+        self.reels = definition.reels
+        self.rows = definition.rows
+        self.cells = definition.reels * definition.rows
+        self.symbols = list(definition.weights)
+        self._codes = {s: i for i, s in enumerate(self.symbols)}
+        self.cum_weights = []
+        acc = 0
+        for s in self.symbols:
+            acc += definition.weights[s]
+            self.cum_weights.append(acc)
+        self.total_weight = acc
+        self._randbelow = secrets.randbelow if definition.rng == "secrets" else random.randrange
+        self.n_lines = 0  # paylines across all rules (grown by the payline evaluators)
+        self.evaluators = [_EVALUATORS[type(rule)](rule, self) for rule in definition.rules]
+
+    def code(self, symbol):
+        return self._codes[symbol]
+
+    # ---- draw ----
+    def draw_symbol(self):
+        return bisect_right(self.cum_weights, self._randbelow(self.total_weight))
+
+    def draw(self):
+        """One weighted grid as a flat list of symbol codes."""
+        cum, total, rnd = self.cum_weights, self.total_weight, self._randbelow
+        return [bisect_right(cum, rnd(total)) for _ in range(self.cells)]
+
+    # ---- evaluate ----
+    def evaluate(self, grid, bet):
+        res = SpinResult()
+        for ev in self.evaluators:
+            ev.evaluate(grid, bet, res)
+        return res
+
+    def spin(self, bet):
+        grid = self.draw()
+        return grid, self.evaluate(grid, bet)
+
+    # ---- conversions ----
+    def names(self, grid):
+        return [self.symbols[c] for c in grid]
+
+    def encode(self, names):
+        return [self._codes[s] for s in names]
+
+    def to_columns(self, grid):
+        """grid[reel][row] of symbol names, as the 5x3 UI expects."""
+        rows = self.rows
+        return [[self.symbols[c] for c in grid[r * rows:(r + 1) * rows]] for r in range(self.reels)]
+
+
+def compile_game(definition):
+    return CompiledGame(definition)
+
+
+# -----------------------
+# Batch path (numpy)
+# -----------------------
+class SpinBatch:
+    """Reusable buffers for drawing and scoring up to `capacity` grids per call.
+
+    Symbols come from one uniform draw per cell mapped through the inverse
+    CDF (a table with one entry per unit of weight), so no draw is ever
+    rejected. Scoring gathers the compiled N-of-a-kind lookup table by grid
+    code. Calls only write into the buffers allocated here; the returned
+    arrays are views that the next call overwrites.
+    """
+
+    def __init__(self, game, capacity, seed=None):
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("numpy is required for batch spins")
+        evs = game.evaluators
+        if len(evs) != 1 or not isinstance(evs[0], _NOfAKindEval) or evs[0].table is None:
+            raise ValueError(f"No batch path for {game.name}: only small N-of-a-kind grids are supported")
+        self.game = game
+        self.capacity = capacity
+        if seed is None:
+            # same entropy source as the game's per-spin draws
+            seed = secrets.randbits(128) if game.definition.rng == "secrets" else random.getrandbits(128)
+        self._rng = np.random.default_rng(seed)
+
+        n_sym = len(game.symbols)
+        self._n_sym = n_sym
+        self._total = game.total_weight
+        self._inverse = None
+        if self._total <= LOOKUP_LIMIT:
+            weights = [game.definition.weights[s] for s in game.symbols]
+            self._inverse = np.repeat(np.arange(n_sym, dtype=np.uint8), weights)
+        self._cum = np.asarray(game.cum_weights, dtype=np.int64)
+        self._mult = np.array([mult for _, _, mult in evs[0].table], dtype=np.int64)
+
+        self.grids = np.empty((capacity, game.cells), dtype=np.uint8)
+        self.payouts = np.empty(capacity, dtype=np.int64)
+        self._codes = np.empty(capacity, dtype=np.intp)
+        block = min(capacity, BATCH_BLOCK) * game.cells
+        self._uniform = np.empty(block, dtype=np.float64)
+        self._index = np.empty(block, dtype=np.intp)
+
+    def draw(self, n=None):
+        """Fills and returns grids[:n] (uint8 symbol codes, one row per spin)."""
+        n = self.capacity if n is None else n
+        if n > self.capacity:
+            raise ValueError(f"Batch of {n} exceeds capacity {self.capacity}")
+        flat = self.grids[:n].reshape(-1)
+        step = len(self._uniform)
+        for start in range(0, len(flat), step):
+            size = min(step, len(flat) - start)
+            u, idx = self._uniform[:size], self._index[:size]
+            self._rng.random(out=u)
+            np.multiply(u, self._total, out=u)
+            np.copyto(idx, u, casting="unsafe")  # floor: u is never negative
+            if self._inverse is not None:
+                # mode="clip" writes straight into out (the default "raise"
+                # buffers it); idx is always in range, so nothing is clipped
+                np.take(self._inverse, idx, out=flat[start:start + size], mode="clip")
+            else:
+                flat[start:start + size] = np.searchsorted(self._cum, idx, side="right")
+        return self.grids[:n]
+
+    def evaluate(self, bet, n=None):
+        """Payouts of grids[:n] for a flat bet, written into payouts[:n]."""
+        n = self.capacity if n is None else n
+        grids, codes, out = self.grids[:n], self._codes[:n], self.payouts[:n]
+        # same code as the per-spin lookup: sum(grid[i] * n_sym ** i)
+        np.copyto(codes, grids[:, -1])
+        for i in range(self.game.cells - 2, -1, -1):
+            np.multiply(codes, self._n_sym, out=codes)
+            np.add(codes, grids[:, i], out=codes)
+        np.take(self._mult, codes, out=out, mode="clip")  # codes < len(_mult); see draw()
+        np.multiply(out, bet, out=out)
+        return out
+
+    def spin(self, bet, n=None):
+        grids = self.draw(n)
+        return grids, self.evaluate(bet, len(grids))
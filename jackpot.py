@@ -0,0 +1,272 @@
+# jackpot.py
+"""
+GoalSpin - Shared progressive jackpot
+- One pool in shared memory fed by every game process on the host
+- Contributions are lock-free: each process owns one counter slot and is
+  its only writer; the pool is the sum of all slots
+- Awards, slot claims and snapshots take an inter-process file lock, which
+  is rare (never on the per-spin path)
+- The pool totals are periodically snapshotted to disk and restored when
+  the shared segment has to be recreated
+"""
+
+import json
+import os
+import struct
+import time
+from multiprocessing import shared_memory
+
+# Optional libs (inter-process lock)
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except Exception:
+    FCNTL_AVAILABLE = False
+
+try:
+    import msvcrt
+    MSVCRT_AVAILABLE = True
+except Exception:
+    MSVCRT_AVAILABLE = False
+
+# -----------------------
+# CONFIG
+# -----------------------
+JACKPOT_NAME = "goalspin_jackpot"
+JACKPOT_LOCK_FILE = "goalspin_jackpot.lock"
+JACKPOT_SNAPSHOT_FILE = "goalspin_jackpot.json"
+JACKPOT_SLOTS = 1024            # max processes attached at once
+JACKPOT_RATE_BP = 100           # contribution per bet, in basis points (1%)
+JACKPOT_SEED = 500              # units put in the pool at start and after every award
+SNAPSHOT_INTERVAL = 5.0         # seconds between durable snapshots (host-wide)
+
+SCALE = 10_000                  # pool is kept in 1/10000 of a unit (exact for basis points)
+MAGIC = 0x4753_4A50_4F54_0001   # "GSJPOT" + layout version
+
+# Header: magic, seeded, paid, retired, awards, last snapshot (ms), then slots of (pid, contributed)
+HEADER = struct.Struct("=qqqqqq")
+SLOT = struct.Struct("=qq")
+OFF_SEEDED, OFF_PAID, OFF_RETIRED, OFF_AWARDS, OFF_SNAPSHOT = 8, 16, 24, 32, 40
+SEGMENT_SIZE = HEADER.size + SLOT.size * JACKPOT_SLOTS
+_Q = struct.Struct("=q")
+
+
+def _pid_alive(pid):
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # exists but owned by someone else (or unsupported check)
+    return True
+
+
+def _untrack(shm):
+    # Before Python 3.13 the resource tracker unlinks every segment this
+    # process touched when it exits, which would wipe the shared pool.
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+class _FileLock:
+    """Exclusive inter-process lock on a file (flock, or msvcrt on Windows)."""
+
+    def __init__(self, path):
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+
+    def acquire(self, blocking=True):
+        if FCNTL_AVAILABLE:
+            flags = fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB)
+            try:
+                fcntl.flock(self._fd, flags)
+            except BlockingIOError:
+                return False
+            return True
+        if MSVCRT_AVAILABLE:
+            mode = msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK
+            while True:
+                try:
+                    os.lseek(self._fd, 0, os.SEEK_SET)
+                    msvcrt.locking(self._fd, mode, 1)
+                    return True
+                except OSError:
+                    if not blocking:
+                        return False
+        return True
+
+    def release(self):
+        if FCNTL_AVAILABLE:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        elif MSVCRT_AVAILABLE:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def close(self):
+        os.close(self._fd)
+
+
+# -----------------------
+# Pool
+# -----------------------
+class JackpotPool:
+    """A process's handle on the shared pool.
+
+    Aligned 8-byte counters are written with a single store by their only
+    writer, so readers never need the lock to see a consistent value.
+    Reads outside the lock (``value()``) are a live estimate; ``award()``
+    reads under the lock and is the only path that takes money out.
+    """
+
+    def __init__(self, name=JACKPOT_NAME, lock_file=JACKPOT_LOCK_FILE,
+                 snapshot_file=JACKPOT_SNAPSHOT_FILE, rate_bp=JACKPOT_RATE_BP, seed=JACKPOT_SEED):
+        self.rate_bp = rate_bp
+        self.seed = seed
+        self.snapshot_file = snapshot_file
+        self._lock = _FileLock(lock_file)
+        self._next_snapshot = 0.0
+        with self._lock:
+            try:
+                self._shm = shared_memory.SharedMemory(name=name, create=True, size=SEGMENT_SIZE)
+                created = True
+            except FileExistsError:
+                self._shm = shared_memory.SharedMemory(name=name)
+                created = False
+            _untrack(self._shm)
+            self._buf = self._shm.buf
+            if created or _Q.unpack_from(self._buf, 0)[0] != MAGIC:
+                self._initialise()
+            self._slot_off = self._claim_slot()
+        self._contributed = 0
+
+    # ---- hot path ----
+    def contribute(self, bet):
+        """Adds this bet's share to the pool. No lock, no I/O."""
+        self._contributed += bet * self.rate_bp
+        _Q.pack_into(self._buf, self._slot_off + 8, self._contributed)
+        if time.monotonic() >= self._next_snapshot:
+            self._maybe_snapshot()
+
+    def value(self):
+        """Current pool in whole units (lock-free estimate)."""
+        return self._pool_scaled() // SCALE
+
+    # ---- award ----
+    def award(self):
+        """Pays out the pool (whole units) and re-seeds it.
+
+        The read-and-reset happens under the inter-process lock, so each
+        unit in the pool is paid to exactly one winner; a second winner at
+        the same moment receives the fresh seed.
+        """
+        with self._lock:
+            won = self._pool_scaled() // SCALE
+            self._add(OFF_PAID, won * SCALE)
+            self._add(OFF_SEEDED, self.seed * SCALE)
+            self._add(OFF_AWARDS, 1)
+            self._write_snapshot()
+        return won
+
+    # ---- lifecycle ----
+    def close(self):
+        """Folds this process's slot into the retired total and detaches."""
+        if self._buf is None:
+            return
+        with self._lock:
+            self._add(OFF_RETIRED, self._contributed)
+            SLOT.pack_into(self._buf, self._slot_off, 0, 0)
+            self._write_snapshot()
+        self._buf = None
+        self._shm.close()
+        self._lock.close()
+
+    # ---- internals ----
+    def _pool_scaled(self):
+        buf = self._buf
+        total = _Q.unpack_from(buf, OFF_SEEDED)[0] + _Q.unpack_from(buf, OFF_RETIRED)[0] \
+            - _Q.unpack_from(buf, OFF_PAID)[0]
+        for off in range(HEADER.size + 8, SEGMENT_SIZE, SLOT.size):
+            total += _Q.unpack_from(buf, off)[0]
+        return total
+
+    def _add(self, off, delta):
+        _Q.pack_into(self._buf, off, _Q.unpack_from(self._buf, off)[0] + delta)
+
+    def _initialise(self):
+        # fresh segment: restore totals from the last durable snapshot
+        seeded, paid, retired, awards = self.seed * SCALE, 0, 0, 0
+        try:
+            with open(self.snapshot_file, "r", encoding="utf-8") as f:
+                snap = json.load(f)
+            seeded, paid = snap["seeded"], snap["paid"]
+            retired, awards = snap["contributed"], snap["awards"]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print("Error cargando bote:", e)
+        self._buf[:SEGMENT_SIZE] = bytes(SEGMENT_SIZE)
+        HEADER.pack_into(self._buf, 0, MAGIC, seeded, paid, retired, awards, 0)
+
+    def _claim_slot(self):
+        # called under the lock; slots of dead processes are folded and reused
+        pid = os.getpid()
+        free = None
+        for off in range(HEADER.size, SEGMENT_SIZE, SLOT.size):
+            owner, contributed = SLOT.unpack_from(self._buf, off)
+            if owner and not _pid_alive(owner):
+                self._add(OFF_RETIRED, contributed)
+                SLOT.pack_into(self._buf, off, 0, 0)
+                owner = 0
+            if owner == 0 and free is None:
+                free = off
+        if free is None:
+            raise RuntimeError("No quedan huecos libres en el bote compartido")
+        SLOT.pack_into(self._buf, free, pid, 0)
+        return free
+
+    def _maybe_snapshot(self):
+        # one process per interval writes the snapshot; the rest skip
+        self._next_snapshot = time.monotonic() + SNAPSHOT_INTERVAL
+        now_ms = int(time.time() * 1000)
+        if now_ms - _Q.unpack_from(self._buf, OFF_SNAPSHOT)[0] < SNAPSHOT_INTERVAL * 1000:
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._write_snapshot()
+        finally:
+            self._lock.release()
+
+    def _write_snapshot(self):
+        # called under the lock
+        buf = self._buf
+        contributed = _Q.unpack_from(buf, OFF_RETIRED)[0]
+        for off in range(HEADER.size + 8, SEGMENT_SIZE, SLOT.size):
+            contributed += _Q.unpack_from(buf, off)[0]
+        snap = {
+            "seeded": _Q.unpack_from(buf, OFF_SEEDED)[0],
+            "paid": _Q.unpack_from(buf, OFF_PAID)[0],
+            "contributed": contributed,
+            "awards": _Q.unpack_from(buf, OFF_AWARDS)[0],
+            "scale": SCALE,
+            "time": time.time(),
+        }
+        tmp = f"{self.snapshot_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snap, f)
+            os.replace(tmp, self.snapshot_file)
+            _Q.pack_into(buf, OFF_SNAPSHOT, int(snap["time"] * 1000))
+        except Exception as e:
+            print("Error guardando bote:", e)
@@ -0,0 +1,248 @@
+# outcome_cache.py
+"""
+GoalSpin - Precomputed outcome tables
+- Derived tables (cumulative weights, line pays, GOLD distribution, exact RTP)
+  of a compiled game are stored in one binary file named after a hash of
+  the game definition
+- The tables are exported from engine.CompiledGame, so the engine stays the
+  only place that derives them from the paytable
+- Readers memory-map the file read-only, so every worker process shares the
+  same pages and the exact statistics are not recomputed while the
+  definition stays the same
+"""
+
+import glob
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+from math import comb
+
+from engine import NOfAKind, Paylines, Scatter
+
+# -----------------------
+# CONFIG
+# -----------------------
+CACHE_DIR = ".goalspin_cache"
+TABLES_VERSION = 2  # bump when the table layout or derivation changes
+
+MAGIC = b"GSOT"
+HEADER = struct.Struct("<4sI32sI")          # magic, version, sha256 digest, section count
+SECTION = struct.Struct("<16sc7xQQQ")       # name, typecode ('q' or 'd'), offset, rows, cols
+
+
+def config_digest(config):
+    """sha256 of the canonical JSON form of the config plus the table version."""
+    blob = json.dumps({"version": TABLES_VERSION, "config": config}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).digest()
+
+
+def game_config(game):
+    """Everything a compiled game's tables depend on (hashed as cache key)."""
+    d = game.definition
+    return {
+        "name": d.name,
+        "reels": d.reels,
+        "rows": d.rows,
+        "weights": [[s, w] for s, w in d.weights.items()],  # order defines codes
+        "rules": [dict(vars(rule), type=type(rule).__name__) for rule in d.rules],
+    }
+
+
+# -----------------------
+# Derivation
+# -----------------------
+def _symbol_probs(game):
+    prev, probs = 0, []
+    for cum in game.cum_weights:
+        probs.append((cum - prev) / game.total_weight)
+        prev = cum
+    return probs
+
+
+def _line_ev(ev, probs, reels):
+    """Exact expected multiplier of one payline of a compiled Paylines rule.
+
+    The first non-wild symbol s sits at column j and the run (s or wild)
+    ends at exactly k columns; a line of wilds only pays the wild row.
+    """
+    wild = ev.wild
+    pw = probs[wild] if wild >= 0 else 0.0
+    total = pw ** reels * ev.line_pay[wild][reels] if wild >= 0 else 0.0
+    for s, ps in enumerate(probs):
+        if s == wild:
+            continue
+        for k in range(ev.min_count, reels + 1):
+            stop = 1.0 if k == reels else 1.0 - ps - pw
+            p_run = sum(pw ** j * ps * (ps + pw) ** (k - j - 1) for j in range(k)) * stop
+            total += p_run * ev.line_pay[s][k]
+    return total
+
+
+def _kind_ev(ev, probs, cells):
+    # expectation over the full lookup table (code digit i = cell i)
+    if ev.table is None:
+        raise ValueError("No exact RTP for an N-of-a-kind grid without a lookup table")
+    total = 0.0
+    for code, (_, _, mult) in enumerate(ev.table):
+        if not mult:
+            continue
+        p = 1.0
+        for _ in range(cells):
+            code, c = divmod(code, ev.n_sym)
+            p *= probs[c]
+        total += p * mult
+    return total
+
+
+def build_tables(game):
+    """Returns {name: (typecode, rows, cols, flat values)} for a CompiledGame."""
+    probs = _symbol_probs(game)
+    reels, cells = game.reels, game.cells
+    tables = {"cum_weights": ("q", 1, len(game.cum_weights), list(game.cum_weights))}
+
+    base_rtp, free_per_spin, gold_pmf = 0.0, 0.0, None
+    n_paylines = 0
+    for rule, ev in zip(game.definition.rules, game.evaluators):
+        if isinstance(rule, Paylines):
+            name = "line_pay" if not n_paylines else f"line_pay_{n_paylines}"
+            n_paylines += 1
+            tables[name] = ("q", len(ev.line_pay), reels + 1, [v for row in ev.line_pay for v in row])
+            base_rtp += _line_ev(ev, probs, reels) * len(ev.lines)
+        elif isinstance(rule, NOfAKind):
+            base_rtp += _kind_ev(ev, probs, cells)
+        elif isinstance(rule, Scatter):
+            # scatter count over the whole grid is binomial
+            pg = probs[ev.code]
+            pmf = [comb(cells, g) * pg ** g * (1 - pg) ** (cells - g) for g in range(cells + 1)]
+            free_per_spin += sum(p * ev.awards[g] for g, p in enumerate(pmf))
+            if gold_pmf is None:
+                gold_pmf = pmf
+    if gold_pmf is not None:
+        tables["gold_pmf"] = ("d", 1, len(gold_pmf), gold_pmf)
+
+    rtp = base_rtp / (1.0 - free_per_spin) if free_per_spin < 1 else float("inf")
+    tables["rtp"] = ("d", 1, 3, [base_rtp, free_per_spin, rtp])
+    return tables
+
+
+# -----------------------
+# Binary file
+# -----------------------
+def write_tables(path, digest, tables):
+    """Writes the tables atomically (temp file + rename)."""
+    names = sorted(tables)
+    offset = HEADER.size + SECTION.size * len(names)
+    entries, payloads = [], []
+    for name in names:
+        typecode, rows, cols, values = tables[name]
+        offset = (offset + 7) & ~7
+        payload = struct.pack(f"<{len(values)}{typecode}", *values)
+        entries.append(SECTION.pack(name.encode("ascii"), typecode.encode("ascii"), offset, rows, cols))
+        payloads.append((offset, payload))
+        offset += len(payload)
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, TABLES_VERSION, digest, len(names)))
+        for entry in entries:
+            f.write(entry)
+        for off, payload in payloads:
+            f.write(b"\0" * (off - f.tell()))
+            f.write(payload)
+    os.replace(tmp, path)
+
+
+class OutcomeTables:
+    """Read-only view over a memory-mapped tables file.
+
+    Sections are zero-copy memoryviews: 1-row tables are flat, others are
+    indexed as table[row, col].
+    """
+
+    def __init__(self, path, digest):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, file_digest, count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != TABLES_VERSION or file_digest != digest:
+            self._mm.close()
+            raise ValueError(f"stale or foreign tables file: {path}")
+        self.digest = digest
+        self._sections = {}
+        self._view = view = memoryview(self._mm)
+        for i in range(count):
+            raw, typecode, off, rows, cols = SECTION.unpack_from(self._mm, HEADER.size + i * SECTION.size)
+            name = raw.rstrip(b"\0").decode("ascii")
+            code = typecode.decode("ascii")
+            section = view[off:off + rows * cols * 8]
+            self._sections[name] = section.cast(code) if rows == 1 else section.cast(code, (rows, cols))
+
+    def __getitem__(self, name):
+        return self._sections[name]
+
+    def __contains__(self, name):
+        return name in self._sections
+
+    @property
+    def cum_weights(self):
+        return self._sections["cum_weights"]
+
+    @property
+    def line_pay(self):
+        return self._sections["line_pay"]
+
+    @property
+    def gold_pmf(self):
+        return self._sections["gold_pmf"]
+
+    @property
+    def rtp(self):
+        """Exact return to player per unit bet, free spins included."""
+        return self._sections["rtp"][2]
+
+    def close(self):
+        for section in self._sections.values():
+            section.release()
+        self._sections = {}
+        self._view.release()
+        self._mm.close()
+
+
+def _evict_stale(cache_dir, prefix, keep):
+    # only files of this prefix with a digest suffix: other games keep their tables
+    pattern = re.compile(re.escape(prefix) + r"-[0-9a-f]{16}\.bin")
+    for old in glob.glob(os.path.join(cache_dir, f"{glob.escape(prefix)}-*.bin")):
+        if old != keep and pattern.fullmatch(os.path.basename(old)):
+            try:
+                os.remove(old)
+            except OSError:
+                pass  # still mapped by another process (Windows)
+
+
+def load_cached(kind, game, config, build, cache_dir=CACHE_DIR):
+    """Maps the `kind` tables of a game for this config, calling build() on first use.
+
+    Files are named <kind>-<game name>-<digest>. When a new one is written,
+    the files of the same kind and game for other configs are removed, so a
+    change invalidates that game's cache by itself without touching others.
+    """
+    digest = config_digest(config)
+    os.makedirs(cache_dir, exist_ok=True)
+    prefix = f"{kind}-{game.name}"
+    path = os.path.join(cache_dir, f"{prefix}-{digest.hex()[:16]}.bin")
+    if os.path.exists(path):
+        try:
+            return OutcomeTables(path, digest)
+        except (ValueError, struct.error, OSError):
+            pass
+    write_tables(path, digest, build())
+    _evict_stale(cache_dir, prefix, path)
+    return OutcomeTables(path, digest)
+
+
+def load_tables(game, cache_dir=CACHE_DIR):
+    """Maps the tables for a compiled game, building the file on first use."""
+    return load_cached("tables", game, game_config(game), lambda: build_tables(game), cache_dir)
@@ -0,0 +1,364 @@
+# risk.py
+"""
+GoalSpin - Bankroll risk engine
+- Exact single-spin distribution of (payout multiplier, free spins awarded)
+  derived from the compiled paytable, not sampled
+- Round distribution: one paid spin plus its whole free-spin chain
+  (retriggers included), solved as a fixed point with FFT convolutions
+- N-round balance distribution by dynamic programming with an absorbing
+  "can't cover the bet" state, giving the risk of ruin directly
+All amounts are in bet units: every paytable entry is a whole multiple of
+the bet, so a balance B with bet b is floor(B / b) units plus a remainder
+that never changes.
+"""
+
+from itertools import product
+
+from engine import Paylines, Scatter
+from outcome_cache import CACHE_DIR, game_config, load_cached
+
+# Optional libs
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except Exception:
+    NUMPY_AVAILABLE = False
+
+# -----------------------
+# CONFIG
+# -----------------------
+ENUM_LIMIT = 1 << 16     # grids with at most this many combinations are enumerated
+ROUND_CAP = 4096         # round payouts are tracked up to this many bet units (last bin = tail)
+FIXED_POINT_TOL = 1e-13
+FIXED_POINT_MAX_ITER = 60
+RISK_VERSION = 1         # bump when the round model changes (invalidates cached pmfs)
+
+_DEAD, _OTHER, _START = -10, -11, -12
+
+
+# -----------------------
+# Single spin (exact)
+# -----------------------
+def spin_distribution(game):
+    """{(multiplier, free_spins): probability} for one spin of a CompiledGame."""
+    if len(game.symbols) ** game.cells <= ENUM_LIMIT:
+        return _enumerate_distribution(game)
+    return _payline_distribution(game)
+
+
+def _probabilities(game):
+    total = game.total_weight
+    prev, probs = 0, []
+    for cum in game.cum_weights:
+        probs.append((cum - prev) / total)
+        prev = cum
+    return probs
+
+
+def _enumerate_distribution(game):
+    probs = _probabilities(game)
+    dist = {}
+    for grid in product(range(len(probs)), repeat=game.cells):
+        p = 1.0
+        for c in grid:
+            p *= probs[c]
+        if p == 0.0:
+            continue
+        res = game.evaluate(list(grid), 1)
+        key = (res.payout, res.free_spins)
+        dist[key] = dist.get(key, 0.0) + p
+    return dist
+
+
+def _payline_distribution(game):
+    """Cell-by-cell DP for games built only from Paylines and Scatter.
+
+    State: per line, the symbol its run is following (or dead / all-wild so
+    far), the multiplier of lines already settled and the scatter count.
+    Cells no live line reads only matter through the scatter count, and
+    symbols that match no live target on a cell are merged into one class.
+    """
+    lines, scatter, awards = [], -1, None
+    for rule, ev in zip(game.definition.rules, game.evaluators):
+        if isinstance(rule, Paylines):
+            for rows in ev.row_of:
+                lines.append((rows, ev.line_pay, ev.wild))
+        elif isinstance(rule, Scatter) and awards is None:
+            scatter, awards = ev.code, ev.awards
+        else:
+            raise ValueError(f"No exact distribution for rule {type(rule).__name__} on a grid this large")
+    probs = _probabilities(game)
+    n_sym, reels, n_rows = len(probs), game.reels, game.rows
+    p_gold = probs[scatter] if scatter >= 0 else 0.0
+    all_symbols = [(s, probs[s]) for s in range(n_sym) if probs[s] > 0]
+
+    def row_classes(targets_on_row, wild):
+        if any(t == _START or t == wild for t in targets_on_row):
+            return all_symbols
+        keep = set(targets_on_row)
+        if wild >= 0:
+            keep.add(wild)
+        if scatter >= 0:
+            keep.add(scatter)
+        classes = [(s, probs[s]) for s in keep if probs[s] > 0]
+        rest = 1.0 - sum(p for _, p in classes)
+        if rest > 1e-15:
+            classes.append((_OTHER, rest))
+        return classes
+
+    row_memo = {}
+
+    def cell_outcomes(col, row, ids, cell_targets):
+        # what one cell does to the lines reading it, merged by effect
+        key = (col, row, ids, cell_targets)
+        cached = row_memo.get(key)
+        if cached is not None:
+            return cached
+        last = col == reels - 1
+        merged = {}
+        for x, px in row_classes(cell_targets, lines[ids[0]][2]):
+            new, pay = [], 0
+            for i, t in zip(ids, cell_targets):
+                line_pay, wild = lines[i][1], lines[i][2]
+                if t == _START or t == wild:
+                    nt = x
+                elif x == t or x == wild:
+                    nt = t
+                else:
+                    nt = _DEAD
+                    pay += line_pay[t][col]
+                if last and nt != _DEAD:
+                    pay += line_pay[nt][reels]  # run reaches the last reel: settle it now
+                    nt = _DEAD
+                new.append(nt)
+            k = (tuple(new), pay, 1 if x == scatter else 0)
+            merged[k] = merged.get(k, 0.0) + px
+        cached = row_memo[key] = list(merged.items())
+        return cached
+
+    # forward pass, one cell at a time: targets -> {acc * G + gold: probability}.
+    # Settled lines are marked dead, so states that can no longer differ merge.
+    G = game.cells + 1
+    unwatched = [(((), 0, 0), 1.0 - p_gold)] + ([(((), 0, 1), p_gold)] if p_gold > 0 else [])
+    states = {tuple([_START] * len(lines)): {0: 1.0}}
+    for col in range(reels):
+        for row in range(n_rows):
+            nxt = {}
+            for targets, inner in states.items():
+                ids = tuple(i for i, t in enumerate(targets) if t != _DEAD and lines[i][0][col] == row)
+                outcomes = cell_outcomes(col, row, ids, tuple(targets[i] for i in ids)) if ids else unwatched
+                for (partial, pay, gold), pt in outcomes:
+                    if ids:
+                        new = list(targets)
+                        for i, nt in zip(ids, partial):
+                            new[i] = nt
+                        new = tuple(new)
+                    else:
+                        new = targets
+                    bucket = nxt.setdefault(new, {})
+                    delta = pay * G + gold
+                    for k, p in inner.items():
+                        k += delta
+                        bucket[k] = bucket.get(k, 0.0) + p * pt
+            states = nxt
+
+    out = {}
+    for inner in states.values():
+        for k, p in inner.items():
+            mult, gold = divmod(k, G)
+            key = (mult, awards[gold] if awards is not None else 0)
+            out[key] = out.get(key, 0.0) + p
+    return out
+
+
+# -----------------------
+# Convolution helpers (pmf arrays truncated at a cap; last bin = tail)
+# -----------------------
+def _conv(a, b, cap):
+    """pmf of X+Y with everything >= cap-1 folded into the last bin."""
+    if NUMPY_AVAILABLE:
+        n = 1
+        while n < len(a) + len(b):
+            n <<= 1
+        full = np.fft.irfft(np.fft.rfft(a, n) * np.fft.rfft(b, n), n)[:len(a) + len(b) - 1]
+        full = np.clip(full, 0.0, None)
+        out = np.zeros(cap)
+        out[:cap - 1] = full[:cap - 1] if len(full) >= cap - 1 else np.pad(full, (0, cap - 1 - len(full)))
+        out[cap - 1] = full[cap - 1:].sum()
+        # keep the total mass exact despite FFT rounding
+        total = out.sum()
+        return out / total * (a.sum() * b.sum()) if total > 0 else out
+    out = [0.0] * cap
+    for i, pa in enumerate(a):
+        if pa == 0.0:
+            continue
+        for j, pb in enumerate(b):
+            if pb == 0.0:
+                continue
+            k = i + j
+            out[k if k < cap else cap - 1] += pa * pb
+    return out
+
+
+def _power(pmf, k, cap, cache):
+    """k-fold convolution power by repeated squaring (memoized in cache)."""
+    if k in cache:
+        return cache[k]
+    if k == 1:
+        result = pmf
+    elif k % 2 == 0:
+        half = _power(pmf, k // 2, cap, cache)
+        result = _conv(half, half, cap)
+    else:
+        result = _conv(_power(pmf, k - 1, cap, cache), pmf, cap)
+    cache[k] = result
+    return result
+
+
+def _fold(pmf, n):
+    """First n bins of pmf with the rest of the mass added to bin n-1."""
+    if len(pmf) <= n:
+        return pmf
+    out = _zeros(n)
+    for i in range(n - 1):
+        out[i] = pmf[i]
+    out[n - 1] = sum(pmf[n - 1:])
+    return out
+
+
+def _zeros(n):
+    return np.zeros(n) if NUMPY_AVAILABLE else [0.0] * n
+
+
+def _add_scaled(out, pmf, scale):
+    if NUMPY_AVAILABLE:
+        out += pmf * scale
+    else:
+        for i, v in enumerate(pmf):
+            out[i] += v * scale
+
+
+# -----------------------
+# Round distribution (paid spin + free-spin chain)
+# -----------------------
+def round_distribution(game, cap=ROUND_CAP):
+    """pmf of the total multiplier of one paid spin and all its free spins.
+
+    T = sum_a P_a * T^(*a), where P_a is the sub-pmf of a spin's multiplier
+    when it awards a free spins. Solved by fixed-point iteration, which
+    converges because fewer than one free spin is awarded per spin on
+    average. Index cap-1 holds the tail mass (>= cap-1 units).
+    """
+    dist = spin_distribution(game)
+    by_award = {}
+    for (mult, free), p in dist.items():
+        sub = by_award.setdefault(free, _zeros(cap))
+        sub[min(mult, cap - 1)] += p
+    base = by_award.pop(0, _zeros(cap))
+    if not by_award:
+        return base
+
+    marginal = _zeros(cap)
+    _add_scaled(marginal, base, 1.0)
+    for sub in by_award.values():
+        _add_scaled(marginal, sub, 1.0)
+
+    current = marginal
+    for _ in range(FIXED_POINT_MAX_ITER):
+        cache = {}
+        nxt = _zeros(cap)
+        _add_scaled(nxt, base, 1.0)
+        for free, sub in by_award.items():
+            chain = _power(current, free, cap, cache)
+            _add_scaled(nxt, _conv(sub, chain, cap), 1.0)
+        delta = sum(abs(x - y) for x, y in zip(nxt, current))
+        current = nxt
+        if delta < FIXED_POINT_TOL:
+            break
+    return current
+
+
+def load_round_distribution(game, cap=ROUND_CAP, cache_dir=CACHE_DIR):
+    """round_distribution() through the config-hash cache (computed once per game definition)."""
+    config = {"game": game_config(game), "cap": cap, "version": RISK_VERSION}
+    tables = load_cached("risk", game, config,
+                         lambda: {"round_pmf": ("d", 1, cap, [float(v) for v in round_distribution(game, cap)])},
+                         cache_dir)
+    try:
+        view = tables["round_pmf"]
+        return np.array(view) if NUMPY_AVAILABLE else list(view)
+    finally:
+        tables.close()
+
+
+# -----------------------
+# N-round bankroll model
+# -----------------------
+class RiskModel:
+    """Balance distribution after N paid rounds for one game.
+
+    The round pmf is computed once per model (or passed in, e.g. from
+    load_round_distribution); each query is a DP over balances in bet
+    units with 0 absorbing (the bet can no longer be covered). Free spins
+    inside a round do not count towards N.
+    """
+
+    def __init__(self, game, cap=ROUND_CAP, round_pmf=None):
+        self.game = game
+        self.round_pmf = round_distribution(game, cap) if round_pmf is None else round_pmf
+        self.round_cap = cap
+
+    def balance_distribution(self, deposit, bet, rounds, cap_units=None):
+        """Returns (pmf, offset, remainder).
+
+        pmf[i] is the probability of ending with offset + i units; balances
+        below offset cannot be reached in `rounds` rounds, so they are not
+        tracked. With offset 0, index 0 is ruin. The last index collects
+        every balance at or above cap_units. Balance in money =
+        units * bet + remainder.
+        """
+        units, remainder = divmod(int(deposit), int(bet))
+        offset = max(0, units - rounds)
+        if cap_units is None:
+            cap_units = units + 10 * rounds + 1
+        cap_units = max(cap_units, rounds + 2, units + 1)
+        size = cap_units - offset + 1
+        top = size - 1
+        first_alive = 1 if offset == 0 else 0
+        step = _fold(self.round_pmf, min(self.round_cap, size))
+
+        state = _zeros(size)
+        state[min(units, cap_units) - offset] = 1.0
+        for _ in range(rounds):
+            nxt = _zeros(size)
+            nxt[0] = state[0] if offset == 0 else 0.0
+            nxt[top] += state[top]  # above any reachable ruin horizon: kept as is
+            alive = state[first_alive:top]
+            # alive index i is pmf index i + first_alive; after paying 1 unit and
+            # winning k it lands on i + first_alive - 1 + k
+            shift = 1 - first_alive
+            if NUMPY_AVAILABLE:
+                moved = _conv(np.asarray(alive), np.asarray(step), size + 1 + shift)
+                nxt[:size] += moved[shift:size + shift]
+                nxt[top] += moved[size + shift]
+            else:
+                moved = _conv(list(alive), list(step), size + 1 + shift)
+                for i in range(size):
+                    nxt[i] += moved[i + shift]
+                nxt[top] += moved[size + shift]
+            state = nxt
+        return state, offset, remainder
+
+    def ruin_probability(self, deposit, bet, rounds):
+        """P(balance drops below the bet within `rounds` paid rounds)."""
+        if bet <= 0 or deposit < bet:
+            return 1.0
+        if deposit // bet > rounds:
+            return 0.0  # at most one unit is lost per round
+        state, _, _ = self.balance_distribution(deposit, bet, rounds, cap_units=rounds + 2)
+        return float(state[0])
+
+    def final_balance(self, deposit, bet, rounds, cap_units=None):
+        """{balance: probability}; the top key means "this much or more"."""
+        state, offset, remainder = self.balance_distribution(deposit, bet, rounds, cap_units)
+        return {(offset + i) * bet + remainder: float(p) for i, p in enumerate(state) if p > 0}
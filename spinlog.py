@@ -0,0 +1,353 @@
+# spinlog.py
+"""
+GoalSpin - Columnar spin log
+- SpinLogWriter streams spin records into fixed-size chunks, one file per
+  column per chunk (.npy), Parquet if pyarrow is installed without numpy,
+  or CSV as the last resort
+- Columns: grid symbol codes, per-line wins, gold (scatter) count,
+  free-spin flag, bet and payout
+- One directory per game and money mode (spinlogs/<game>/<mode>), so
+  play-money spins never mix into the real-money RTP report
+- `python spinlog.py analyze DIR` reports RTP, hit rate and per-line stats
+  chunk by chunk, so memory stays bounded whatever the log size
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import shutil
+import sys
+import time
+import uuid
+from array import array
+
+# Optional libs
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except Exception:
+    NUMPY_AVAILABLE = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except Exception:
+    PYARROW_AVAILABLE = False
+
+# -----------------------
+# CONFIG
+# -----------------------
+SPIN_LOG_DIR = "spinlogs"
+CHUNK_ROWS = 1 << 16
+SCHEMA_FILE = "schema.json"
+
+# Interactive games: small chunks, and pending rows written after at most
+# FLUSH_INTERVAL seconds, so a crash loses only the last few spins
+INTERACTIVE_CHUNK_ROWS = 1024
+FLUSH_INTERVAL = 10.0
+
+
+def log_directory(game, mode, root=SPIN_LOG_DIR):
+    """spinlogs/<game>/<mode>: one log per game and money mode ("real" / "free")."""
+    return os.path.join(root, game.name, mode)
+
+
+def default_format():
+    if NUMPY_AVAILABLE:
+        return "npy"
+    if PYARROW_AVAILABLE:
+        return "parquet"
+    return "csv"
+
+
+def _csv_header(cells, lines):
+    return ([f"g{i}" for i in range(cells)] + [f"l{i}" for i in range(lines)]
+            + ["gold", "free", "bet", "payout"])
+
+
+# -----------------------
+# Writer
+# -----------------------
+class SpinLogWriter:
+    """Buffers spin records per column and writes them out in chunks.
+
+    Chunks are written under a temporary name and renamed when complete,
+    so readers only ever see whole chunks. File names carry the writer's
+    start time and a random id, so several writers (or a reused pid) can
+    share one directory without overwriting each other.
+    """
+
+    def __init__(self, directory, game, chunk_rows=CHUNK_ROWS, fmt=None, mode=None, flush_interval=None):
+        self.directory = directory
+        self.cells = game.cells
+        self.lines = game.n_lines
+        self.chunk_rows = chunk_rows
+        self.fmt = fmt or default_format()
+        self.flush_interval = flush_interval
+        self._flush_due = None
+        self._seq = 0
+        self._run = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex}"
+        os.makedirs(directory, exist_ok=True)
+        schema = {"game": game.name, "mode": mode, "symbols": game.symbols, "cells": self.cells,
+                  "lines": self.lines, "format": self.fmt}
+        schema_path = os.path.join(directory, SCHEMA_FILE)
+        if os.path.exists(schema_path):
+            with open(schema_path, "r", encoding="utf-8") as f:
+                existing = json.load(f)
+            if {k: existing.get(k) for k in ("game", "mode", "cells", "lines")} != \
+                    {k: schema[k] for k in ("game", "mode", "cells", "lines")}:
+                raise ValueError(f"{directory} holds logs of another game or mode: "
+                                 f"{existing.get('game')} ({existing.get('mode')})")
+        else:
+            with open(schema_path, "w", encoding="utf-8") as f:
+                json.dump(schema, f, indent=2)
+        self._reset()
+
+    def _reset(self):
+        self._grid = array("B")
+        self._line = array("q")
+        self._gold = array("B")
+        self._free = array("B")
+        self._bet = array("q")
+        self._payout = array("q")
+        self._rows = 0
+
+    def record(self, grid, bet, payout, line_wins=(), gold=0, free=False):
+        """grid: flat symbol codes; line_wins: engine (line, symbol, count, payout) tuples."""
+        self._grid.extend(grid)
+        wins = [0] * self.lines
+        for line, _, _, pay in line_wins:
+            wins[line] = pay
+        self._line.extend(wins)
+        self._gold.append(gold)
+        self._free.append(1 if free else 0)
+        self._bet.append(bet)
+        self._payout.append(payout)
+        self._rows += 1
+        if self._rows >= self.chunk_rows:
+            self.flush()
+        elif self.flush_interval is not None:
+            if self._flush_due is None:
+                self._flush_due = time.monotonic() + self.flush_interval
+            self.maybe_flush()
+
+    def maybe_flush(self):
+        """Writes pending rows once they are FLUSH_INTERVAL old (call from a timer too)."""
+        if self._rows and self._flush_due is not None and time.monotonic() >= self._flush_due:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        self._seq += 1
+        name = f"chunk-{self._run}-{self._seq:06d}"
+        try:
+            getattr(self, f"_write_{self.fmt}")(name)
+        except Exception as e:
+            print("Error guardando registro de tiradas:", e)
+            self._discard_tmp(name)
+        self._reset()
+        self._flush_due = None
+
+    def close(self):
+        self.flush()
+
+    def _tmp_path(self, name):
+        return os.path.join(self.directory, f".{name}.tmp")
+
+    def _discard_tmp(self, name):
+        tmp = self._tmp_path(name)
+        try:
+            if os.path.isdir(tmp):
+                shutil.rmtree(tmp)
+            elif os.path.exists(tmp):
+                os.remove(tmp)
+        except OSError as e:
+            print("Error borrando fichero temporal:", e)
+
+    # ---- formats ----
+    def _columns_numpy(self):
+        n = self._rows
+        return {
+            "grid": np.frombuffer(self._grid, dtype=np.uint8).reshape(n, self.cells),
+            "lines": np.frombuffer(self._line, dtype=np.int64).reshape(n, self.lines),
+            "gold": np.frombuffer(self._gold, dtype=np.uint8),
+            "free": np.frombuffer(self._free, dtype=np.uint8),
+            "bet": np.frombuffer(self._bet, dtype=np.int64),
+            "payout": np.frombuffer(self._payout, dtype=np.int64),
+        }
+
+    def _write_npy(self, name):
+        tmp = self._tmp_path(name)
+        os.makedirs(tmp, exist_ok=True)
+        for col, values in self._columns_numpy().items():
+            np.save(os.path.join(tmp, f"{col}.npy"), values)
+        os.replace(tmp, os.path.join(self.directory, name))
+
+    def _write_parquet(self, name):
+        cols = {}
+        for i in range(self.cells):
+            cols[f"g{i}"] = pa.array(self._grid[i::self.cells], type=pa.uint8())
+        for i in range(self.lines):
+            cols[f"l{i}"] = pa.array(self._line[i::self.lines], type=pa.int64())
+        cols["gold"] = pa.array(self._gold, type=pa.uint8())
+        cols["free"] = pa.array(self._free, type=pa.uint8())
+        cols["bet"] = pa.array(self._bet, type=pa.int64())
+        cols["payout"] = pa.array(self._payout, type=pa.int64())
+        tmp = self._tmp_path(name)
+        pq.write_table(pa.table(cols), tmp)
+        os.replace(tmp, os.path.join(self.directory, f"{name}.parquet"))
+
+    def _write_csv(self, name):
+        tmp = self._tmp_path(name)
+        cells, lines = self.cells, self.lines
+        with open(tmp, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(_csv_header(cells, lines))
+            for i in range(self._rows):
+                w.writerow(list(self._grid[i * cells:(i + 1) * cells]) + list(self._line[i * lines:(i + 1) * lines])
+                           + [self._gold[i], self._free[i], self._bet[i], self._payout[i]])
+        os.replace(tmp, os.path.join(self.directory, f"{name}.csv"))
+
+
+# -----------------------
+# Analysis
+# -----------------------
+class SpinStats:
+    """Totals accumulated chunk by chunk."""
+
+    def __init__(self, cells, lines):
+        self.rows = 0
+        self.free_rows = 0
+        self.hits = 0
+        self.total_bet = 0
+        self.total_payout = 0
+        self.line_hits = [0] * lines
+        self.line_payout = [0] * lines
+        self.gold_hist = [0] * (cells + 1)
+
+    def add_numpy(self, grid, lines, gold, free, bet, payout):
+        free = free.astype(bool)
+        self.rows += len(bet)
+        self.free_rows += int(free.sum())
+        self.hits += int((payout > 0).sum())
+        self.total_bet += int(bet[~free].sum())
+        self.total_payout += int(payout.sum())
+        if lines.shape[1]:
+            hits = (lines > 0).sum(axis=0)
+            pays = lines.sum(axis=0)
+            for i in range(lines.shape[1]):
+                self.line_hits[i] += int(hits[i])
+                self.line_payout[i] += int(pays[i])
+        for g, n in enumerate(np.bincount(gold, minlength=len(self.gold_hist))):
+            self.gold_hist[g] += int(n)
+
+    def add_row(self, line_wins, gold, free, bet, payout):
+        self.rows += 1
+        if free:
+            self.free_rows += 1
+        else:
+            self.total_bet += bet
+        if payout > 0:
+            self.hits += 1
+        self.total_payout += payout
+        for i, pay in enumerate(line_wins):
+            if pay > 0:
+                self.line_hits[i] += 1
+                self.line_payout[i] += pay
+        self.gold_hist[gold] += 1
+
+    def report(self):
+        rows = self.rows or 1
+        return {
+            "rows": self.rows,
+            "free_rows": self.free_rows,
+            "total_bet": self.total_bet,
+            "total_payout": self.total_payout,
+            "rtp": self.total_payout / self.total_bet if self.total_bet else 0.0,
+            "hit_rate": self.hits / rows,
+            "lines": [{"line": i, "hits": h, "hit_rate": h / rows, "payout": p,
+                       "rtp": p / self.total_bet if self.total_bet else 0.0}
+                      for i, (h, p) in enumerate(zip(self.line_hits, self.line_payout))],
+            "gold_hist": self.gold_hist,
+        }
+
+
+def _iter_chunks(directory):
+    # only complete chunks; temp files start with "."
+    for path in sorted(glob.glob(os.path.join(directory, "chunk-*"))):
+        yield path
+
+
+def analyze(directory):
+    with open(os.path.join(directory, SCHEMA_FILE), "r", encoding="utf-8") as f:
+        schema = json.load(f)
+    cells, lines = schema["cells"], schema["lines"]
+    stats = SpinStats(cells, lines)
+    for path in _iter_chunks(directory):
+        if os.path.isdir(path):
+            if not NUMPY_AVAILABLE:
+                raise RuntimeError("numpy is required to read .npy chunks")
+            cols = {c: np.load(os.path.join(path, f"{c}.npy"), mmap_mode="r")
+                    for c in ("grid", "lines", "gold", "free", "bet", "payout")}
+            stats.add_numpy(**cols)
+        elif path.endswith(".parquet"):
+            if not PYARROW_AVAILABLE:
+                raise RuntimeError("pyarrow is required to read .parquet chunks")
+            table = pq.read_table(path, columns=[f"l{i}" for i in range(lines)] + ["gold", "free", "bet", "payout"])
+            if NUMPY_AVAILABLE:
+                line_cols = [table.column(f"l{i}").to_numpy() for i in range(lines)]
+                stats.add_numpy(None, np.stack(line_cols, axis=1) if lines else np.zeros((table.num_rows, 0), np.int64),
+                                table.column("gold").to_numpy(), table.column("free").to_numpy(),
+                                table.column("bet").to_numpy(), table.column("payout").to_numpy())
+            else:
+                cols = table.to_pydict()
+                for r in range(table.num_rows):
+                    stats.add_row([cols[f"l{i}"][r] for i in range(lines)], cols["gold"][r],
+                                  cols["free"][r], cols["bet"][r], cols["payout"][r])
+        elif path.endswith(".csv"):
+            with open(path, newline="", encoding="utf-8") as f:
+                reader = csv.reader(f)
+                next(reader)
+                for row in reader:
+                    vals = [int(v) for v in row[cells:]]
+                    stats.add_row(vals[:lines], *vals[lines:])
+    rep = stats.report()
+    rep["game"], rep["mode"] = schema.get("game"), schema.get("mode")
+    return rep
+
+
+def _print_report(rep):
+    print(f"Juego: {rep['game']}  Modo: {rep['mode'] or '-'}")
+    print(f"Tiradas: {rep['rows']} (gratis: {rep['free_rows']})")
+    print(f"Apostado: {rep['total_bet']}  Pagado: {rep['total_payout']}")
+    print(f"RTP: {rep['rtp'] * 100:.3f} %  Tasa de acierto: {rep['hit_rate'] * 100:.3f} %")
+    for line in rep["lines"]:
+        print(f"  Línea {line['line']}: aciertos {line['hits']} ({line['hit_rate'] * 100:.3f} %), "
+              f"pagado {line['payout']} (RTP {line['rtp'] * 100:.3f} %)")
+    print("Balones dorados:", " ".join(f"{g}:{n}" for g, n in enumerate(rep["gold_hist"]) if n))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GoalSpin spin log tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_an = sub.add_parser("analyze", help="RTP, hit rate and per-line stats of a log directory (spinlogs/<game>/<mode>)")
+    p_an.add_argument("directory")
+    p_an.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.command == "analyze":
+        rep = analyze(args.directory)
+        if args.json:
+            json.dump(rep, sys.stdout, indent=2)
+            print()
+        else:
+            _print_report(rep)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+# storage.py
+"""
+GoalSpin - SQLite account store
+- One database for every player account and both game modes
+- WAL journal: readers never block the writer and vice versa
+- Writes are queued and committed in batches by a background thread
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+
+# -----------------------
+# CONFIG
+# -----------------------
+DB_FILE = "goalspin.db"
+BATCH_SIZE = 256          # max queued writes per transaction
+BATCH_INTERVAL = 0.2      # seconds the writer waits to fill a batch
+BUSY_TIMEOUT_MS = 5000    # wait for other processes holding the write lock
+STATEMENT_CACHE = 64
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    id      INTEGER PRIMARY KEY,
+    name    TEXT NOT NULL,
+    mode    TEXT NOT NULL,
+    balance INTEGER NOT NULL,
+    created REAL NOT NULL,
+    UNIQUE (name, mode)
+);
+CREATE TABLE IF NOT EXISTS deposits (
+    id        INTEGER PRIMARY KEY,
+    player_id INTEGER NOT NULL REFERENCES players(id),
+    ts        REAL NOT NULL,
+    amount    INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS spins (
+    id        INTEGER PRIMARY KEY,
+    player_id INTEGER NOT NULL REFERENCES players(id),
+    ts        REAL NOT NULL,
+    bet       INTEGER NOT NULL,
+    payout    INTEGER NOT NULL,
+    symbols   TEXT NOT NULL,
+    result    TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_spins_player_ts ON spins (player_id, ts);
+CREATE INDEX IF NOT EXISTS idx_deposits_player_ts ON deposits (player_id, ts);
+"""
+
+# Statements are module constants so sqlite3's per-connection cache reuses
+# the compiled form on every call.
+SQL_INSERT_PLAYER = "INSERT OR IGNORE INTO players (name, mode, balance, created) VALUES (?, ?, ?, ?)"
+SQL_SELECT_PLAYER = "SELECT id, balance, created FROM players WHERE name = ? AND mode = ?"
+SQL_UPDATE_BALANCE = "UPDATE players SET balance = ? WHERE id = ?"
+SQL_INSERT_SPIN = "INSERT INTO spins (player_id, ts, bet, payout, symbols, result) VALUES (?, ?, ?, ?, ?, ?)"
+SQL_INSERT_DEPOSIT = "INSERT INTO deposits (player_id, ts, amount) VALUES (?, ?, ?)"
+SQL_RECENT_SPINS = ("SELECT ts, bet, payout, symbols, result FROM spins "
+                    "WHERE player_id = ? ORDER BY ts DESC, id DESC LIMIT ?")
+SQL_SPINS_RANGE = ("SELECT ts, bet, payout, symbols, result FROM spins "
+                   "WHERE player_id = ? AND ts >= ? AND ts < ? ORDER BY ts, id")
+SQL_DEPOSITS_RANGE = ("SELECT ts, amount FROM deposits "
+                      "WHERE player_id = ? AND ts >= ? AND ts < ? ORDER BY ts, id")
+
+_STOP = object()
+_FLUSH = object()  # ends the current batch early and commits it
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000,
+                           isolation_level=None, cached_statements=STATEMENT_CACHE)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    return conn
+
+
+# -----------------------
+# Store
+# -----------------------
+class AccountStore:
+    """Player accounts, deposits and spin records in one SQLite file.
+
+    Reads run on the caller's connection; balance updates, spins and
+    deposits are queued and written by a single background thread that
+    commits up to BATCH_SIZE of them per transaction.
+    """
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self._conn = _connect(path)
+        self._conn.executescript(SCHEMA)
+        self._queue = queue.Queue()
+        self._error = None
+        self._writer = threading.Thread(target=self._write_loop, name="goalspin-db-writer", daemon=True)
+        self._writer.start()
+
+    # ---- accounts ----
+    def open_account(self, name, mode, start_balance):
+        """Returns (player_id, balance, created) for the (name, mode) account."""
+        self.flush()
+        cur = self._conn.execute(SQL_INSERT_PLAYER, (name, mode, start_balance, time.time()))
+        created = cur.rowcount == 1
+        player_id, balance, _ = self._conn.execute(SQL_SELECT_PLAYER, (name, mode)).fetchone()
+        return player_id, balance, created
+
+    # ---- queued writes ----
+    def set_balance(self, player_id, balance):
+        self._put(SQL_UPDATE_BALANCE, (balance, player_id))
+
+    def record_spin(self, player_id, bet, payout, symbols, result, ts=None):
+        ts = time.time() if ts is None else ts
+        self._put(SQL_INSERT_SPIN, (player_id, ts, bet, payout, ",".join(symbols), result))
+
+    def record_deposit(self, player_id, amount, ts=None):
+        ts = time.time() if ts is None else ts
+        self._put(SQL_INSERT_DEPOSIT, (player_id, ts, amount))
+
+    # ---- reads (flush first so the caller sees its own writes) ----
+    def recent_spins(self, player_id, limit):
+        """Newest first: list of (ts, bet, payout, symbols, result)."""
+        self.flush()
+        rows = self._conn.execute(SQL_RECENT_SPINS, (player_id, limit)).fetchall()
+        return [(ts, bet, payout, symbols.split(","), result) for ts, bet, payout, symbols, result in rows]
+
+    def iter_spins(self, player_id, start=0.0, end=float("inf")):
+        """Oldest first, streamed from the (player_id, ts) index."""
+        self.flush()
+        for ts, bet, payout, symbols, result in self._conn.execute(SQL_SPINS_RANGE, (player_id, start, end)):
+            yield ts, bet, payout, symbols.split(","), result
+
+    def iter_deposits(self, player_id, start=0.0, end=float("inf")):
+        self.flush()
+        yield from self._conn.execute(SQL_DEPOSITS_RANGE, (player_id, start, end))
+
+    # ---- lifecycle ----
+    def flush(self):
+        """Blocks until every queued write has been committed.
+
+        A flush marker wakes the writer, so the pending batch is committed
+        right away instead of after the rest of BATCH_INTERVAL.
+        """
+        if self._writer.is_alive():
+            self._queue.put(_FLUSH)
+        self._queue.join()
+        if self._error is not None:
+            err, self._error = self._error, None
+            raise err
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        self._conn.close()
+
+    # ---- writer thread ----
+    def _put(self, sql, params):
+        self._queue.put((sql, params))
+
+    def _write_loop(self):
+        conn = _connect(self.path)
+        try:
+            while True:
+                item = self._queue.get()
+                batch = [item]
+                deadline = time.monotonic() + BATCH_INTERVAL
+                while item is not _STOP and item is not _FLUSH and len(batch) < BATCH_SIZE:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    batch.append(item)
+                stop = batch[-1] is _STOP
+                ops = [op for op in batch if op is not _STOP and op is not _FLUSH]
+                try:
+                    if ops:
+                        self._commit(conn, ops)
+                except Exception as e:
+                    print("Error guardando en la base de datos:", e)
+                    self._error = e
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _commit(conn, ops):
+        # Group consecutive writes that share a statement into one executemany
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            i = 0
+            while i < len(ops):
+                sql = ops[i][0]
+                j = i
+                while j < len(ops) and ops[j][0] == sql:
+                    j += 1
+                conn.executemany(sql, [params for _, params in ops[i:j]])
+                i = j
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
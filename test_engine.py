@@ -0,0 +1,125 @@
+# test_engine.py
+"""
+Engine checks: both games against the evaluators they replaced, and the
+N-of-a-kind rule on grids the 3-reel game never produces.
+Run with: python -m pytest -q
+"""
+
+import random
+from itertools import product
+
+import codigo1
+import codigocasidefinitivo as gb
+from engine import GameDefinition, NOfAKind, compile_game
+
+
+# -----------------------
+# Reference evaluators (as they were before the engine)
+# -----------------------
+def _ref_three_reel(symbols, bet):
+    if all(s == symbols[0] for s in symbols):
+        return bet * codigo1.PAYOUT_3.get(symbols[0], 0)
+    counts = {}
+    for s in symbols:
+        counts[s] = counts.get(s, 0) + 1
+    if 2 in counts.values():
+        return bet * codigo1.PAYOUT_2
+    return 0
+
+
+def _ref_line(symbols_line, bet):
+    first_non = next((s for s in symbols_line if s != gb.WILD_KEY), None)
+    if first_non is None:
+        cnt = len(symbols_line)
+        return (bet * gb.ALL_WILD_PAY, cnt) if cnt >= 3 else (0, 0)
+    cnt = 0
+    for s in symbols_line:
+        if s == first_non or s == gb.WILD_KEY:
+            cnt += 1
+        else:
+            break
+    if cnt >= 3:
+        mult = gb.COUNT_MULT.get(cnt, gb.COUNT_MULT[max(gb.COUNT_MULT)])
+        return bet * gb.BASE_PAYOUT.get(first_non, 0) * mult, cnt
+    return 0, 0
+
+
+def _ref_golden_ball(columns, bet):
+    total, positions = 0, []
+    for pattern in gb.PAYLINES:
+        payout, cnt = _ref_line([columns[c][pattern[c]] for c in range(gb.REELS)], bet)
+        if payout > 0:
+            total += payout
+            positions.extend((c, pattern[c]) for c in range(cnt))
+    gold = sum(col.count(gb.SCATTER_KEY) for col in columns)
+    return total, positions, gold
+
+
+# -----------------------
+# Equivalence with the original games
+# -----------------------
+def test_three_reel_matches_original_on_every_grid():
+    game = codigo1.GAME
+    for grid in product(range(len(game.symbols)), repeat=game.cells):
+        names = game.names(grid)
+        assert game.evaluate(list(grid), 3).payout == _ref_three_reel(names, 3), names
+
+
+def test_golden_ball_matches_original_on_random_grids():
+    game = gb.GAME
+    rnd = random.Random(1234)
+    n_sym = len(game.symbols)
+    for _ in range(50_000):
+        grid = [rnd.randrange(n_sym) for _ in range(game.cells)]
+        res = game.evaluate(grid, 2)
+        payout, positions, gold = _ref_golden_ball(game.to_columns(grid), 2)
+        assert (res.payout, res.positions, res.scatter_count) == (payout, positions, gold)
+
+
+# -----------------------
+# N-of-a-kind rule
+# -----------------------
+def _kind_game(cells, pays, weights=None):
+    weights = weights or {"a": 1, "b": 1, "c": 1}
+    return compile_game(GameDefinition("kind_test", reels=cells, rows=1, weights=weights,
+                                       rules=[NOfAKind(pays)]))
+
+
+def test_larger_group_qualifies_for_smaller_size():
+    game = _kind_game(4, {3: 10})
+    res = game.evaluate(game.encode(["b", "b", "b", "b"]), 1)
+    assert (res.payout, res.kind_count, game.symbols[res.kind_symbol]) == (10, 4, "b")
+
+
+def test_tie_on_size_pays_highest_multiplier():
+    game = _kind_game(6, {3: {"a": 2, "b": 9}})
+    res = game.evaluate(game.encode(["a", "b", "a", "b", "a", "b"]), 1)
+    assert (res.payout, game.symbols[res.kind_symbol]) == (9, "b")
+
+
+def test_highest_multiplier_wins_over_larger_size():
+    game = _kind_game(5, {2: {"c": 20}, 3: 4})
+    res = game.evaluate(game.encode(["a", "a", "a", "c", "c"]), 1)
+    assert (res.payout, res.kind_count, game.symbols[res.kind_symbol]) == (20, 2, "c")
+
+
+def test_lookup_table_and_direct_evaluation_agree():
+    # 3 symbols on 11 cells exceeds LOOKUP_LIMIT, so the big grid is scored per spin
+    pays = {2: 1, 3: {"a": 5, "b": 7}, 4: 30}
+    small, big = _kind_game(4, pays), _kind_game(11, pays)
+    assert small.evaluators[0].table is not None and big.evaluators[0].table is None
+
+    def expected(game, grid):
+        best = 0
+        for sym in set(grid):
+            for size, pay in pays.items():
+                mult = pay.get(game.symbols[sym], 0) if isinstance(pay, dict) else pay
+                if grid.count(sym) >= size:
+                    best = max(best, mult)
+        return best
+
+    rnd = random.Random(7)
+    for game in (small, big):
+        for _ in range(2000):
+            grid = [rnd.randrange(3) for _ in range(game.cells)]
+            assert game.evaluate(grid, 1).payout == expected(game, grid)